@@ -18,10 +18,12 @@ from handlers.video_handlers import handle_video_conversion
 from handlers.text_handlers import handle_text_conversion
 from routes import setup_routes
 from utils import setup_static_folder
+from uploads import IngestRequest
 
 # Initialize Flask app
 app = Flask(__name__, static_url_path=STATIC_URL_PATH, static_folder=STATIC_FOLDER)
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+app.request_class = IngestRequest  # Stream large uploads straight to disk
 CORS(app)  # Enable CORS for all routes
 
 # Initialize rate limiter
@@ -0,0 +1,387 @@
+"""Benchmark every converter through the app and compare against a baseline.
+
+Run from the project root:
+
+    python -m benchmarks.converters --save baseline.json
+    python -m benchmarks.converters --compare baseline.json
+
+Synthetic fixtures are generated from fixed seeds: images of several sizes and
+formats, tone audio, a test-pattern video and a multi-page Markdown document
+with DOCX and PDF renderings of it. Each case posts a fixture to its endpoint
+through the Flask test client, with the conversion cache and rate limits
+disabled, and reports throughput, p50/p99 latency and peak RSS.
+
+Every case runs in a freshly spawned process and reports that process's
+VmHWM, so its peak RSS is its own rather than the high-water mark of the
+fixture generation and cases before it. The largest converter worker or
+ffmpeg process is reported separately as child RSS; children are forked from
+the case process and start from its high-water mark, so this is an upper
+bound on what the child itself used.
+
+With --compare, cases whose p50 latency grew by more than --threshold are
+reported as regressions and the exit status is 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from multiprocessing import get_context
+
+import numpy as np
+from PIL import Image
+
+import media
+from config import CPU_COUNT
+from document import parse_markdown, write_docx, write_pdf
+
+GROUPS = ('image', 'audio', 'video', 'text', 'units')
+DEFAULT_ITERATIONS = {'image': 10, 'audio': 5, 'video': 3, 'text': 5, 'units': 200}
+IMAGE_SIZES = {'small': (640, 480), 'medium': (1920, 1080), 'large': (4000, 3000)}
+AUDIO_SECONDS = 30
+VIDEO_SECONDS = 5
+VIDEO_SIZE = '640x360'
+DOCUMENT_SECTIONS = 60
+SEED = 1234
+# Packages whose upgrades the baseline is meant to catch
+PACKAGES = ('Flask', 'Pillow', 'pillow-heif', 'pillow-avif-plugin', 'pydub', 'moviepy', 'PyPDF2',
+            'python-docx', 'numpy', 'imageio-ffmpeg')
+
+
+def make_image(path, size, seed):
+    """Write a gradient with seeded noise, which neither compresses trivially nor varies between runs."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                       (x + y) / 2], axis=-1)
+    pixels = pixels + rng.normal(0, 12, pixels.shape)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+
+def make_audio(path, seconds):
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'sine=frequency=440:beep_factor=4:duration={seconds}',
+        '-ac', '2', path
+    ])
+
+
+def make_video(path, seconds, size, codecs):
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=duration={seconds}:size={size}:rate=30',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        *codecs, '-pix_fmt', 'yuv420p', '-shortest', path
+    ])
+
+
+def make_markdown(sections, seed):
+    """Return a document of headings, paragraphs, lists and code long enough to span many pages."""
+    rng = np.random.default_rng(seed)
+    words = ('converter', 'stream', 'format', 'image', 'page', 'latency', 'buffer', 'encode',
+             'cache', 'worker', 'sample', 'profile', 'document', 'output', 'request', 'quality')
+    lines = ['# Benchmark document', '']
+    for section in range(1, sections + 1):
+        lines += [f'## Section {section}', '']
+        for _ in range(3):
+            sentence = ' '.join(rng.choice(words, 60))
+            lines += [f'{sentence.capitalize()} with **bold** and *italic* text.', '']
+        lines += [f'- {" ".join(rng.choice(words, 8))}' for _ in range(4)] + ['']
+        lines += ['```', f'value = {section} * factor', 'print(value)', '```', '']
+    return '\n'.join(lines)
+
+
+def make_fixtures(directory):
+    """Write every fixture into directory, skipping those already there, and return their paths."""
+    paths = {}
+
+    def fixture(name, write):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            write(path)
+        paths[name] = path
+
+    for index, (label, size) in enumerate(IMAGE_SIZES.items()):
+        for extension in ('png', 'jpg', 'webp'):
+            fixture(f'{label}.{extension}', lambda path: make_image(path, size, SEED + index))
+    fixture('tone.wav', lambda path: make_audio(path, AUDIO_SECONDS))
+    fixture('tone.mp3', lambda path: make_audio(path, AUDIO_SECONDS))
+    # Two codecs, so that each target has a source it must re-encode
+    fixture('pattern.mp4', lambda path: make_video(
+        path, VIDEO_SECONDS, VIDEO_SIZE, ['-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac']
+    ))
+    fixture('pattern.webm', lambda path: make_video(
+        path, VIDEO_SECONDS, VIDEO_SIZE, ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-c:a', 'libopus']
+    ))
+
+    markdown = make_markdown(DOCUMENT_SECTIONS, SEED)
+
+    def write_markdown(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(markdown)
+
+    fixture('document.md', write_markdown)
+    fixture('document.docx', lambda path: write_docx(parse_markdown(markdown.splitlines()), path))
+    fixture('document.pdf', lambda path: write_pdf(parse_markdown(markdown.splitlines()), path))
+    return paths
+
+
+class Case:
+    """One benchmarked request, described by plain data so it can be sent to a fresh process."""
+
+    def __init__(self, name, group, route, upload=None, form=None, json=None):
+        self.name = name
+        self.group = group
+        self.route = route
+        self.upload = upload  # (form field, fixture path)
+        self.form = form or {}
+        self.json = json
+
+    def request_args(self):
+        """Return test client arguments; called per request, since the client consumes open files."""
+        if self.upload is None:
+            return {'json': self.json}
+        field, path = self.upload
+        return {'data': {field: (open(path, 'rb'), os.path.basename(path)), **self.form}}
+
+
+def build_cases(fixtures):
+    cases = []
+    for label in IMAGE_SIZES:
+        for source, target in (('png', 'webp'), ('jpg', 'png'), ('webp', 'jpeg')):
+            cases.append(Case(f'image:{label}-{source}-to-{target}', 'image', '/convert/image',
+                              upload=('image', fixtures[f'{label}.{source}']), form={'format': target}))
+    cases.append(Case('image:large-jpg-thumbnail', 'image', '/convert/image',
+                      upload=('image', fixtures['large.jpg']), form={'format': 'webp', 'max_width': '320'}))
+
+    for source, target in (('wav', 'mp3'), ('wav', 'ogg'), ('mp3', 'flac')):
+        cases.append(Case(f'audio:{source}-to-{target}', 'audio', '/convert/audio',
+                          upload=('audio', fixtures[f'tone.{source}']), form={'format': target}))
+
+    for source, target, profile in (('webm', 'mp4', 'fast'), ('webm', 'mp4', 'balanced'), ('mp4', 'webm', 'fast')):
+        cases.append(Case(f'video:{source}-to-{target}-{profile}', 'video', '/convert/video',
+                          upload=('file', fixtures[f'pattern.{source}']),
+                          form={'targetFormat': target, 'profile': profile}))
+    # h264 fits mov as is, so this measures the remux path
+    cases.append(Case('video:mp4-to-mov-remux', 'video', '/convert/video',
+                      upload=('file', fixtures['pattern.mp4']), form={'targetFormat': 'mov'}))
+
+    for source, target in (('md', 'pdf'), ('md', 'docx'), ('docx', 'md'), ('docx', 'pdf'),
+                           ('pdf', 'txt'), ('pdf', 'docx')):
+        cases.append(Case(f'text:{source}-to-{target}', 'text', '/convert/text',
+                          upload=('file', fixtures[f'document.{source}']), form={'target_format': target}))
+
+    rng = np.random.default_rng(SEED)
+    values = rng.uniform(0, 1000, 10000).round(3).tolist()
+    hex_colors = [f'#{value:06x}' for value in rng.integers(0, 0xffffff, 5000)]
+    cases += [
+        Case('units:length', 'units', '/convert/length',
+             json={'value': 12.5, 'from_unit': 'km', 'to_unit': 'mi'}),
+        Case('units:temperature', 'units', '/convert/temperature',
+             json={'value': 21.5, 'from_unit': 'c', 'to_unit': 'f'}),
+        Case('units:bulk-10k', 'units', '/convert/bulk',
+             json={'category': 'weight', 'values': values, 'from_unit': 'kg', 'to_unit': 'lb'}),
+        Case('units:color-bulk-5k', 'units', '/convert/color/bulk',
+             json={'colors': hex_colors, 'from_format': 'hex', 'to_format': 'oklab', 'nearest': 'css'}),
+    ]
+    return cases
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, int(np.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _peak_rss_mb(who):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _own_peak_rss_mb():
+    """Return this process's peak RSS since it was started.
+
+    ru_maxrss survives exec, so a spawned process would report its parent's
+    high-water mark at fork time. VmHWM belongs to the address space exec
+    replaced, so it is used where /proc provides it.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return _peak_rss_mb(resource.RUSAGE_SELF)
+
+
+def run_case(case, iterations, warmup):
+    """Run one case in this process and return its measurements."""
+    # Per-request log lines would drown the results; errors still show
+    logging.disable(logging.INFO)
+    from app import app
+    import extensions
+    from cache import conversion_cache
+    from executors import shutdown_pools
+
+    # Every repeat must convert rather than hit the cache or the rate limits
+    conversion_cache.enabled = False
+    extensions.limiter.enabled = False
+    client = app.test_client()
+
+    def call():
+        response = client.post(case.route, **case.request_args())
+        try:
+            body = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {body[:200]!r}")
+            return len(body)
+        finally:
+            response.close()
+
+    latencies = []
+    try:
+        for _ in range(warmup):
+            call()
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            call_started = time.perf_counter()
+            output_bytes = call()
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+    finally:
+        # Joined workers are counted in the children's usage, and this
+        # process cannot exit while they wait for work
+        shutdown_pools()
+    latencies.sort()
+    input_bytes = os.path.getsize(case.upload[1]) if case.upload else None
+    return {
+        'iterations': iterations,
+        'seconds': round(elapsed, 4),
+        'throughput': round(iterations / elapsed, 2),
+        'input_mb_per_second': round(input_bytes * iterations / elapsed / 1e6, 2) if input_bytes else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'input_bytes': input_bytes,
+        'output_bytes': output_bytes,
+        'peak_rss_mb': _own_peak_rss_mb(),
+        'peak_child_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    }
+
+
+def run_isolated(case, iterations, warmup):
+    # Spawn rather than fork so the case starts without the parent's memory
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(run_case, case, iterations, warmup).result()
+
+
+def environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': CPU_COUNT,
+        'packages': versions
+    }
+
+
+def compare(results, failures, baseline, threshold):
+    """Print each case's change against the baseline and return the names of regressed cases."""
+    previous = baseline['results']
+    # A case that used to work and now fails is the worst kind of regression
+    regressions = [name for name in failures if name in previous]
+    print(f"\n{'case':<36}{'p50 ms':>10}{'was':>10}{'change':>9}{'p99 change':>12}{'RSS change':>12}")
+    for name, result in results.items():
+        before = previous.get(name)
+        if before is None:
+            print(f"{name:<36}{result['p50_ms']:>10.1f}{'new':>10}")
+            continue
+        p50 = result['p50_ms'] / before['p50_ms'] - 1
+        p99 = result['p99_ms'] / before['p99_ms'] - 1
+        rss = result['peak_rss_mb'] - before['peak_rss_mb']
+        flag = ''
+        if p50 > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<36}{result['p50_ms']:>10.1f}{before['p50_ms']:>10.1f}{p50:>+9.1%}{p99:>+12.1%}"
+              f"{rss:>+10.1f}MB{flag}")
+
+    changed = {package: (baseline['environment']['packages'].get(package), version)
+               for package, version in environment()['packages'].items()
+               if baseline['environment']['packages'].get(package) != version}
+    for package, (before, after) in changed.items():
+        print(f"{package} changed from {before} to {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', nargs='+', default=list(GROUPS), choices=GROUPS, help='Converters to benchmark')
+    parser.add_argument('--cases', nargs='+', help='Only run cases whose name contains one of these')
+    parser.add_argument('--iterations', type=int, help='Timed requests per case, instead of the per-group default')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per case before timing')
+    parser.add_argument('--fixtures', help='Keep fixtures in this directory and reuse them across runs')
+    parser.add_argument('--save', help='Write the results to this JSON file to use as a baseline')
+    parser.add_argument('--compare', help='Compare the results with this baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='p50 slowdown, as a fraction, reported as a regression')
+    options = parser.parse_args()
+
+    fixture_dir = options.fixtures or tempfile.mkdtemp(prefix='converter_bench_')
+    os.makedirs(fixture_dir, exist_ok=True)
+    results = {}
+    failures = {}
+    try:
+        cases = [case for case in build_cases(make_fixtures(fixture_dir)) if case.group in options.groups]
+        if options.cases:
+            cases = [case for case in cases if any(part in case.name for part in options.cases)]
+
+        print(f"{'case':<36}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'MB/s':>8}{'RSS MB':>9}{'child MB':>10}")
+        for case in cases:
+            iterations = options.iterations or DEFAULT_ITERATIONS[case.group]
+            try:
+                result = results[case.name] = run_isolated(case, iterations, options.warmup)
+            except Exception as e:
+                # One broken converter should not hide the others' numbers
+                failures[case.name] = str(e)
+                print(f"{case.name:<36}failed: {e}")
+                continue
+            print(f"{case.name:<36}{result['throughput']:>9.2f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                  f"{result['input_mb_per_second'] or 0:>8.1f}{result['peak_rss_mb']:>9.1f}"
+                  f"{result['peak_child_rss_mb']:>10.1f}")
+    finally:
+        if not options.fixtures:
+            shutil.rmtree(fixture_dir, ignore_errors=True)
+
+    report = {'environment': environment(), 'results': results, 'failures': failures}
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, failures, baseline, options.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) failing or slower than the baseline by more than {options.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure video encode speed per profile on this host.
+
+Run from the project root:
+
+    python -m benchmarks.video_profiles --duration 10 --size 1280x720 --concurrency 1 2
+
+A synthetic clip is generated once and re-encoded to every format with every
+profile, using the same ffmpeg arguments and thread counts as the app. The
+results are printed as a table and optionally written to a JSON file so
+hosts and settings can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import media
+from config import CPU_COUNT
+from handlers.video_handlers import VIDEO_PROFILES, build_ffmpeg_args, encoder_threads
+
+
+def make_source(path, duration, size, rate):
+    """Write a lossless test clip, so every target format has to re-encode the video."""
+    media.run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=duration={duration}:size={size}:rate={rate}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'ffv1', '-c:a', 'pcm_s16le', path
+    ])
+
+
+def encode(info, source, output, target_format, profile, threads):
+    args = build_ffmpeg_args(info, source, output, target_format, 'high', profile, threads)
+    media.run_ffmpeg(args)
+    return os.path.getsize(output)
+
+
+def run_case(info, source, work_dir, target_format, profile, concurrency):
+    """Run concurrency encodes at once and return their combined throughput."""
+    threads = encoder_threads(concurrency)
+    outputs = [os.path.join(work_dir, f'{profile}-{n}.{target_format}') for n in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sizes = list(executor.map(
+            lambda output: encode(info, source, output, target_format, profile, threads), outputs
+        ))
+    elapsed = time.perf_counter() - started
+    frames = info['duration'] * media.first_stream(info, 'video')['fps'] * concurrency
+    return {
+        'format': target_format,
+        'profile': profile,
+        'concurrency': concurrency,
+        'threads': threads,
+        'seconds': round(elapsed, 3),
+        'fps': round(frames / elapsed, 1),
+        'output_bytes': sizes[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=int, default=10, help='Length of the test clip in seconds')
+    parser.add_argument('--size', default='1280x720', help='Frame size of the test clip')
+    parser.add_argument('--rate', type=int, default=30, help='Frame rate of the test clip')
+    parser.add_argument('--formats', nargs='+', default=['mp4', 'webm'], help='Target formats to encode')
+    parser.add_argument('--profiles', nargs='+', default=list(VIDEO_PROFILES), choices=list(VIDEO_PROFILES))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1], help='Simultaneous encodes to run')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    options = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='video_bench_')
+    try:
+        source = os.path.join(work_dir, 'source.mkv')
+        make_source(source, options.duration, options.size, options.rate)
+        info = media.probe_media(source)
+
+        results = []
+        print(f"{'format':<8}{'profile':<10}{'jobs':>5}{'threads':>9}{'seconds':>10}{'fps':>9}{'KiB':>10}")
+        for target_format in options.formats:
+            for profile in options.profiles:
+                for concurrency in options.concurrency:
+                    result = run_case(info, source, work_dir, target_format, profile, concurrency)
+                    results.append(result)
+                    print(f"{target_format:<8}{profile:<10}{concurrency:>5}{result['threads']:>9}"
+                          f"{result['seconds']:>10.2f}{result['fps']:>9.1f}{result['output_bytes'] // 1024:>10}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if options.output:
+        report = {
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'cpu_count': CPU_COUNT,
+            'clip': {'duration': options.duration, 'size': options.size, 'rate': options.rate},
+            'results': results
+        }
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
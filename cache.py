@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import CACHE_ENABLED, CACHE_DIR, CACHE_MAX_BYTES, logger
+from uploads import upload_digest
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows; eviction is then only serialized within a process
+    fcntl = None
+
+
+def file_digest(file, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of an uploaded file and rewind it."""
+    # Large uploads were already hashed while they were written to disk
+    digest = upload_digest(file)
+    if digest:
+        return digest
+
+    stream = getattr(file, 'stream', file)
+    digest = hashlib.sha256()
+    with metrics.stage('hash'):
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+        stream.seek(0)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Size-bounded on-disk store of conversion results with LRU eviction.
+
+    Entries are keyed by the input digest plus the conversion options, so the
+    same upload converted to the same target is only converted once.
+
+    The web process and the converter pool workers share the directory. Each
+    keeps its own index, adopts entries other processes wrote when it first
+    looks them up, and re-reads the directory under a file lock before
+    evicting, so max_bytes bounds the directory rather than each process.
+    """
+
+    def __init__(self, directory, max_bytes, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _load(self):
+        """Index entries left on disk by earlier runs, oldest access first."""
+        with self._directory_lock():
+            self._scan()
+            self._evict()
+
+    @contextmanager
+    def _directory_lock(self):
+        """Hold an exclusive lock shared by every process using the directory."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """Rebuild the index from the directory; mtime is the last access, so it gives the LRU order."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Evicted by another process while listing
+                continue
+            entries.append((stat.st_mtime_ns, name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._size = sum(self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def make_key(self, digest, **options):
+        """Build a cache key from an input digest and the conversion options."""
+        payload = json.dumps({'input': digest, 'options': options}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the path of a cached result, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                size = None
+            if size is not None:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                else:
+                    # Stored by another process, e.g. an async job in a pool worker
+                    self._entries[key] = size
+                    self._size += size
+                self.hits += 1
+                try:
+                    # mtime records last access so the LRU order survives restarts
+                    os.utime(path)
+                except OSError:
+                    pass
+                metrics.record_cache_lookup(True)
+                return path
+            if key in self._entries:
+                # Removed behind our back, e.g. by another worker process
+                self._size -= self._entries.pop(key)
+            self.misses += 1
+            metrics.record_cache_lookup(False)
+            return None
+
+    def put_bytes(self, key, data):
+        """Store an in-memory result."""
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        self._store(key, lambda f: f.write(data))
+
+    def put_file(self, key, source_path):
+        """Store a result that was written to disk."""
+        if not self.enabled or os.path.getsize(source_path) > self.max_bytes:
+            return
+        def copy(f):
+            with open(source_path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+        self._store(key, copy)
+
+    def _store(self, key, write):
+        with metrics.stage('cache_store'):
+            self._write_entry(key, write)
+
+    def _write_entry(self, key, write):
+        try:
+            # Write to a temporary name first so readers never see a partial entry
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to store conversion result in cache: {str(e)}")
+            return
+
+        # Other processes store entries too, so the directory is re-read to
+        # account for them; a listing is cheap next to the conversion itself
+        with self._lock, self._directory_lock():
+            self._scan()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits in max_bytes.
+
+        Callers hold the directory lock after re-reading the directory.
+        """
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return hit/miss counters and current usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
+
+
+conversion_cache = ConversionCache(CACHE_DIR, CACHE_MAX_BYTES, enabled=CACHE_ENABLED)
@@ -0,0 +1,345 @@
+import re
+from functools import lru_cache
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    # Nearest-color lookups fall back to a brute-force NumPy search
+    cKDTree = None
+
+# Formats colors can be read from and written to
+COLOR_FORMATS = ('hex', 'rgb', 'hsl', 'cmyk', 'lab', 'oklab')
+# Number of components in each numeric format
+_COMPONENTS = {'rgb': 3, 'hsl': 3, 'cmyk': 4, 'lab': 3, 'oklab': 3}
+# Decimal places kept when writing each format
+_PRECISION = {'rgb': 0, 'hsl': 0, 'cmyk': 0, 'lab': 2, 'oklab': 4}
+
+_NUMBER_RE = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?', re.IGNORECASE)
+# Color literals in a stylesheet, optionally declared as a custom property
+_CSS_COLOR_RE = re.compile(
+    r'(?:(--[\w-]+)\s*:\s*)?(#[0-9a-f]{6}\b|#[0-9a-f]{3}\b|rgba?\([^)]*\)|hsla?\([^)]*\))',
+    re.IGNORECASE
+)
+
+# sRGB (D65) to CIE XYZ, and the D65 reference white
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+# Linear sRGB to OKLab, from Björn Ottosson's reference implementation
+_RGB_TO_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+])
+_LMS_TO_OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+])
+_LMS_TO_RGB = np.linalg.inv(_RGB_TO_LMS)
+_OKLAB_TO_LMS = np.linalg.inv(_LMS_TO_OKLAB)
+
+# CSS Color Module Level 4 named colors
+CSS_NAMED_COLORS = {
+    'aliceblue': '#f0f8ff', 'antiquewhite': '#faebd7', 'aqua': '#00ffff', 'aquamarine': '#7fffd4',
+    'azure': '#f0ffff', 'beige': '#f5f5dc', 'bisque': '#ffe4c4', 'black': '#000000',
+    'blanchedalmond': '#ffebcd', 'blue': '#0000ff', 'blueviolet': '#8a2be2', 'brown': '#a52a2a',
+    'burlywood': '#deb887', 'cadetblue': '#5f9ea0', 'chartreuse': '#7fff00', 'chocolate': '#d2691e',
+    'coral': '#ff7f50', 'cornflowerblue': '#6495ed', 'cornsilk': '#fff8dc', 'crimson': '#dc143c',
+    'cyan': '#00ffff', 'darkblue': '#00008b', 'darkcyan': '#008b8b', 'darkgoldenrod': '#b8860b',
+    'darkgray': '#a9a9a9', 'darkgreen': '#006400', 'darkgrey': '#a9a9a9', 'darkkhaki': '#bdb76b',
+    'darkmagenta': '#8b008b', 'darkolivegreen': '#556b2f', 'darkorange': '#ff8c00', 'darkorchid': '#9932cc',
+    'darkred': '#8b0000', 'darksalmon': '#e9967a', 'darkseagreen': '#8fbc8f', 'darkslateblue': '#483d8b',
+    'darkslategray': '#2f4f4f', 'darkslategrey': '#2f4f4f', 'darkturquoise': '#00ced1', 'darkviolet': '#9400d3',
+    'deeppink': '#ff1493', 'deepskyblue': '#00bfff', 'dimgray': '#696969', 'dimgrey': '#696969',
+    'dodgerblue': '#1e90ff', 'firebrick': '#b22222', 'floralwhite': '#fffaf0', 'forestgreen': '#228b22',
+    'fuchsia': '#ff00ff', 'gainsboro': '#dcdcdc', 'ghostwhite': '#f8f8ff', 'gold': '#ffd700',
+    'goldenrod': '#daa520', 'gray': '#808080', 'green': '#008000', 'greenyellow': '#adff2f',
+    'grey': '#808080', 'honeydew': '#f0fff0', 'hotpink': '#ff69b4', 'indianred': '#cd5c5c',
+    'indigo': '#4b0082', 'ivory': '#fffff0', 'khaki': '#f0e68c', 'lavender': '#e6e6fa',
+    'lavenderblush': '#fff0f5', 'lawngreen': '#7cfc00', 'lemonchiffon': '#fffacd', 'lightblue': '#add8e6',
+    'lightcoral': '#f08080', 'lightcyan': '#e0ffff', 'lightgoldenrodyellow': '#fafad2', 'lightgray': '#d3d3d3',
+    'lightgreen': '#90ee90', 'lightgrey': '#d3d3d3', 'lightpink': '#ffb6c1', 'lightsalmon': '#ffa07a',
+    'lightseagreen': '#20b2aa', 'lightskyblue': '#87cefa', 'lightslategray': '#778899', 'lightslategrey': '#778899',
+    'lightsteelblue': '#b0c4de', 'lightyellow': '#ffffe0', 'lime': '#00ff00', 'limegreen': '#32cd32',
+    'linen': '#faf0e6', 'magenta': '#ff00ff', 'maroon': '#800000', 'mediumaquamarine': '#66cdaa',
+    'mediumblue': '#0000cd', 'mediumorchid': '#ba55d3', 'mediumpurple': '#9370db', 'mediumseagreen': '#3cb371',
+    'mediumslateblue': '#7b68ee', 'mediumspringgreen': '#00fa9a', 'mediumturquoise': '#48d1cc',
+    'mediumvioletred': '#c71585', 'midnightblue': '#191970', 'mintcream': '#f5fffa', 'mistyrose': '#ffe4e1',
+    'moccasin': '#ffe4b5', 'navajowhite': '#ffdead', 'navy': '#000080', 'oldlace': '#fdf5e6',
+    'olive': '#808000', 'olivedrab': '#6b8e23', 'orange': '#ffa500', 'orangered': '#ff4500',
+    'orchid': '#da70d6', 'palegoldenrod': '#eee8aa', 'palegreen': '#98fb98', 'paleturquoise': '#afeeee',
+    'palevioletred': '#db7093', 'papayawhip': '#ffefd5', 'peachpuff': '#ffdab9', 'peru': '#cd853f',
+    'pink': '#ffc0cb', 'plum': '#dda0dd', 'powderblue': '#b0e0e6', 'purple': '#800080',
+    'rebeccapurple': '#663399', 'red': '#ff0000', 'rosybrown': '#bc8f8f', 'royalblue': '#4169e1',
+    'saddlebrown': '#8b4513', 'salmon': '#fa8072', 'sandybrown': '#f4a460', 'seagreen': '#2e8b57',
+    'seashell': '#fff5ee', 'sienna': '#a0522d', 'silver': '#c0c0c0', 'skyblue': '#87ceeb',
+    'slateblue': '#6a5acd', 'slategray': '#708090', 'slategrey': '#708090', 'snow': '#fffafa',
+    'springgreen': '#00ff7f', 'steelblue': '#4682b4', 'tan': '#d2b48c', 'teal': '#008080',
+    'thistle': '#d8bfd8', 'tomato': '#ff6347', 'turquoise': '#40e0d0', 'violet': '#ee82ee',
+    'wheat': '#f5deb3', 'white': '#ffffff', 'whitesmoke': '#f5f5f5', 'yellow': '#ffff00',
+    'yellowgreen': '#9acd32'
+}
+
+
+def _check_format(color_format):
+    if color_format not in COLOR_FORMATS:
+        raise ValueError(f"Unknown color format: {color_format}. Available: {', '.join(COLOR_FORMATS)}")
+
+
+def _parse_hex(values):
+    digits = [str(value).strip().lstrip('#') for value in values]
+    digits = [value if len(value) == 6 else ''.join(c + c for c in value) if len(value) == 3 else None
+              for value in digits]
+    if None in digits:
+        raise ValueError(f"Invalid hex color: {values[digits.index(None)]}")
+    try:
+        data = bytes.fromhex(''.join(digits))
+    except ValueError:
+        raise ValueError("Invalid hex color in input")
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.float64)
+
+
+def _parse_numbers(values, components):
+    """Read 'a,b,c' strings or [a, b, c] lists into an (n, components) array."""
+    if all(isinstance(value, str) for value in values):
+        # Fast path for plain comma-separated numbers
+        commas = np.char.count(np.asarray(values, dtype=str), ',')
+        try:
+            if np.all(commas == components - 1):
+                return np.array(','.join(values).split(','), dtype=np.float64).reshape(-1, components)
+        except ValueError:
+            pass
+        # CSS notation such as "rgb(10 20 30)" or "210, 50%, 40%"
+        rows = [_NUMBER_RE.findall(value)[:components] for value in values]
+    else:
+        rows = [value.split(',') if isinstance(value, str) else value for value in values]
+
+    for value, row in zip(values, rows):
+        if len(row) != components:
+            raise ValueError(f"Expected {components} components in color: {value}")
+    return np.array(rows, dtype=np.float64).reshape(-1, components)
+
+
+def _hsl_to_rgb(hsl):
+    h, s, l = hsl[:, 0:1] % 360, hsl[:, 1:2] / 100, hsl[:, 2:3] / 100
+    a = s * np.minimum(l, 1 - l)
+    k = (np.array([0, 8, 4]) + h / 30) % 12
+    return 255 * (l - a * np.clip(np.minimum(k - 3, 9 - k), -1, 1))
+
+
+def _rgb_to_hsl(rgb):
+    rgb = rgb / 255
+    high, low = rgb.max(axis=1), rgb.min(axis=1)
+    chroma = high - low
+    l = (high + low) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(chroma == 0, 0, chroma / (1 - np.abs(2 * l - 1)))
+        r, g, b = rgb.T
+        h = np.select(
+            [chroma == 0, high == r, high == g],
+            [0, ((g - b) / chroma) % 6, (b - r) / chroma + 2],
+            (r - g) / chroma + 4
+        ) * 60
+    return np.column_stack([h, s * 100, l * 100])
+
+
+def _cmyk_to_rgb(cmyk):
+    cmyk = cmyk / 100
+    return 255 * (1 - cmyk[:, :3]) * (1 - cmyk[:, 3:4])
+
+
+def _rgb_to_cmyk(rgb):
+    rgb = rgb / 255
+    k = 1 - rgb.max(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cmy = np.where(k < 1, (1 - rgb - k) / (1 - k), 0)
+    return np.hstack([cmy, k]) * 100
+
+
+def _to_linear(rgb):
+    c = rgb / 255
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def _from_linear(linear):
+    c = np.clip(linear, 0, 1)
+    return 255 * np.where(c <= 0.0031308, c * 12.92, 1.055 * c ** (1 / 2.4) - 0.055)
+
+
+def _rgb_to_lab(rgb):
+    xyz = _to_linear(rgb) @ _RGB_TO_XYZ.T / _D65_WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.column_stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])])
+
+
+def _lab_to_rgb(lab):
+    fy = (lab[:, 0] + 16) / 116
+    f = np.column_stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200])
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _D65_WHITE
+    return _from_linear(xyz @ _XYZ_TO_RGB.T)
+
+
+def rgb_to_oklab(rgb):
+    return np.cbrt(_to_linear(rgb) @ _RGB_TO_LMS.T) @ _LMS_TO_OKLAB.T
+
+
+def oklab_to_rgb(oklab):
+    return _from_linear((oklab @ _OKLAB_TO_LMS.T) ** 3 @ _LMS_TO_RGB.T)
+
+
+_TO_RGB = {'hsl': _hsl_to_rgb, 'cmyk': _cmyk_to_rgb, 'lab': _lab_to_rgb, 'oklab': oklab_to_rgb}
+_FROM_RGB = {'hsl': _rgb_to_hsl, 'cmyk': _rgb_to_cmyk, 'lab': _rgb_to_lab, 'oklab': rgb_to_oklab}
+
+
+def parse_colors(values, color_format):
+    """Read a list of colors in color_format into an (n, 3) array of sRGB values from 0 to 255."""
+    _check_format(color_format)
+    values = list(values)
+    if not values:
+        return np.empty((0, 3))
+    if color_format == 'hex':
+        return _parse_hex(values)
+    array = _parse_numbers(values, _COMPONENTS[color_format])
+    return array if color_format == 'rgb' else _TO_RGB[color_format](array)
+
+
+def convert_colors(rgb, color_format):
+    """Convert an (n, 3) sRGB array to an (n, k) array in color_format, rounded for output."""
+    _check_format(color_format)
+    if color_format in ('hex', 'rgb'):
+        return np.clip(np.rint(rgb), 0, 255).astype(np.int64)
+    # Adding zero turns the -0.0 rounding leaves behind into 0.0
+    return np.round(_FROM_RGB[color_format](rgb), _PRECISION[color_format]) + 0.0
+
+
+def format_colors(rgb, color_format):
+    """Convert an (n, 3) sRGB array to strings in color_format, in the style of convert_color."""
+    array = convert_colors(rgb, color_format)
+    if color_format == 'hex':
+        digits = array.astype(np.uint8).tobytes().hex()
+        return ['#' + digits[i:i + 6] for i in range(0, len(digits), 6)]
+    if _PRECISION[color_format] == 0:
+        array = array.astype(np.int64)
+    return [','.join(map(str, row)) for row in array.tolist()]
+
+
+def detect_format(value):
+    """Guess the format of a single CSS color literal."""
+    value = value.strip().lower()
+    if value.startswith('#'):
+        return 'hex'
+    if value.startswith('hsl'):
+        return 'hsl'
+    return 'rgb'
+
+
+def extract_css_colors(text):
+    """Find the color literals in a stylesheet.
+
+    Returns (names, values): names are the custom properties the colors are
+    assigned to, or None for colors used elsewhere.
+    """
+    names, values = [], []
+    for match in _CSS_COLOR_RE.finditer(text):
+        names.append(match.group(1))
+        values.append(match.group(2))
+    return names, values
+
+
+def parse_mixed(values):
+    """Read CSS color literals of any supported format into an (n, 3) sRGB array."""
+    formats = [detect_format(value) for value in values]
+    rgb = np.empty((len(values), 3))
+    for color_format in set(formats):
+        positions = [i for i, f in enumerate(formats) if f == color_format]
+        rgb[positions] = parse_colors([values[i] for i in positions], color_format)
+    return rgb
+
+
+def _squared_distances(points, centers):
+    return (points ** 2).sum(axis=1)[:, np.newaxis] - 2 * points @ centers.T + (centers ** 2).sum(axis=1)
+
+
+def dominant_colors(rgb, count, iterations=20, seed=0):
+    """Cluster (n, 3) sRGB pixels into count dominant colors with k-means in OKLab.
+
+    Returns (colors, shares): the cluster centers as sRGB, most common first,
+    and the fraction of pixels each one covers. Seeding is k-means++ with a
+    fixed seed, so the same pixels always give the same palette.
+    """
+    points = rgb_to_oklab(np.asarray(rgb, dtype=np.float64))
+    count = min(count, len(np.unique(np.asarray(rgb, dtype=np.uint8), axis=0)))
+    rng = np.random.default_rng(seed)
+
+    # k-means++: each new center is drawn in proportion to its distance from the nearest chosen one
+    centers = points[[rng.integers(len(points))]]
+    nearest = _squared_distances(points, centers)[:, 0]
+    while len(centers) < count:
+        weights = np.maximum(nearest, 0)
+        choice = rng.choice(len(points), p=weights / weights.sum())
+        centers = np.vstack([centers, points[choice]])
+        nearest = np.minimum(nearest, _squared_distances(points, centers[-1:])[:, 0])
+
+    for _ in range(iterations):
+        labels = _squared_distances(points, centers).argmin(axis=1)
+        sizes = np.bincount(labels, minlength=count)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        moved = np.where(sizes[:, np.newaxis] > 0, sums / np.maximum(sizes, 1)[:, np.newaxis], centers)
+        if np.allclose(moved, centers, atol=1e-5):
+            break
+        centers = moved
+
+    labels = _squared_distances(points, centers).argmin(axis=1)
+    shares = np.bincount(labels, minlength=count) / len(points)
+    order = np.argsort(-shares, kind='stable')
+    return oklab_to_rgb(centers[order]), shares[order]
+
+
+class PaletteIndex:
+    """Named colors indexed in OKLab for perceptual nearest-color lookups."""
+
+    def __init__(self, names, rgb):
+        self.names = list(names)
+        self.rgb = np.asarray(rgb, dtype=np.float64)
+        self.points = rgb_to_oklab(self.rgb)
+        self.tree = cKDTree(self.points) if cKDTree is not None else None
+
+    def nearest(self, rgb, chunk_size=4096):
+        """Return the palette index and OKLab distance of the closest entry to each color."""
+        query = rgb_to_oklab(np.asarray(rgb, dtype=np.float64))
+        if self.tree is not None:
+            distances, indices = self.tree.query(query)
+            return indices, distances
+
+        indices = np.empty(len(query), dtype=np.intp)
+        distances = np.empty(len(query))
+        squared_points = (self.points ** 2).sum(axis=1)
+        # |q - p|^2 = |q|^2 - 2 q.p + |p|^2, in chunks to bound the distance matrix
+        for start in range(0, len(query), chunk_size):
+            chunk = query[start:start + chunk_size]
+            squared = (chunk ** 2).sum(axis=1)[:, np.newaxis] - 2 * chunk @ self.points.T + squared_points
+            best = squared.argmin(axis=1)
+            indices[start:start + chunk_size] = best
+            distances[start:start + chunk_size] = np.sqrt(np.maximum(squared[np.arange(len(chunk)), best], 0))
+        return indices, distances
+
+
+@lru_cache(maxsize=32)
+def palette_index(palette=None):
+    """Return a cached index of a palette given as ((name, hex), ...), or of the CSS named colors."""
+    if palette is None:
+        # Aliases such as grey/gray share a value; keep the first name
+        unique = {}
+        for name, value in CSS_NAMED_COLORS.items():
+            unique.setdefault(value, name)
+        palette = tuple((name, value) for value, name in unique.items())
+    names = [name for name, _ in palette]
+    return PaletteIndex(names, parse_mixed([value for _, value in palette]))
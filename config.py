@@ -1,4 +1,6 @@
 import logging
+import os
+import tempfile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -7,12 +9,30 @@ logger = logging.getLogger(__name__)
 # File size limits
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
 
+# Uploads larger than this are streamed straight to disk in UPLOAD_DIR
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), 'converter_uploads')
+UPLOAD_SPOOL_THRESHOLD = 500 * 1024
+
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp', 'heic', 'avif'}
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'ogg', 'flac', 'm4a', 'aac'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 ALLOWED_TEXT_EXTENSIONS = {'txt', 'doc', 'docx', 'pdf', 'rtf', 'odt', 'md'}
 
+# Video transcoding engine: 'ffmpeg' drives ffmpeg directly, 'moviepy' decodes frames in Python
+VIDEO_ENGINE = os.environ.get('VIDEO_ENGINE', 'ffmpeg')
+# Upper bound on encoder threads; x264 and VP9 gain little beyond this
+VIDEO_MAX_THREADS = 16
+# Videos at least this long (seconds) are split at keyframes and the pieces
+# encoded in parallel, each piece covering at least VIDEO_SEGMENT_MIN_LENGTH
+# seconds with VIDEO_SEGMENT_THREADS encoder threads
+VIDEO_SEGMENT_MIN_DURATION = int(os.environ.get('VIDEO_SEGMENT_MIN_DURATION', 600))
+VIDEO_SEGMENT_MIN_LENGTH = 30
+VIDEO_SEGMENT_THREADS = 2
+
+# Time zone library for time conversions: 'pytz' or 'zoneinfo'
+TIME_ZONE_BACKEND = os.environ.get('TIME_ZONE_BACKEND', 'pytz')
+
 # Rate limiting configuration
 RATE_LIMIT_DEFAULT = ["200 per day", "50 per hour"]
 RATE_LIMIT_VIDEO = "10 per minute"
@@ -20,12 +40,67 @@ RATE_LIMIT_AUDIO = "20 per minute"
 RATE_LIMIT_IMAGE = "30 per minute"
 RATE_LIMIT_TEXT = "20 per minute"
 
+# Process pools for CPU-bound conversions. Each admits workers + queue tasks;
+# beyond that requests get a 503 with Retry-After (seconds). Video encoders
+# are multi-threaded themselves, so those pools get fewer processes.
+CPU_COUNT = os.cpu_count() or 1
+EXECUTOR_POOLS = {
+    'image': {'workers': CPU_COUNT, 'queue': CPU_COUNT * 4, 'retry_after': 2},
+    'audio': {'workers': CPU_COUNT, 'queue': CPU_COUNT * 2, 'retry_after': 5},
+    'text': {'workers': CPU_COUNT, 'queue': CPU_COUNT * 4, 'retry_after': 2},
+    'pdf': {'workers': CPU_COUNT, 'queue': CPU_COUNT * 8, 'retry_after': 5},
+    'video': {'workers': max(1, CPU_COUNT // 4), 'queue': CPU_COUNT, 'retry_after': 30},
+    'jobs': {'workers': max(1, CPU_COUNT // 4), 'queue': 100, 'retry_after': 60},
+}
+
+# Batch image conversion
+IMAGE_BATCH_MAX_FILES = 500
+
+# PDF text extraction: pages are split into chunks extracted on the pdf pool
+PDF_CHUNK_PAGES = 25
+
+# Conversion result cache
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'converter_cache')
+CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+
+# Currency exchange rates
+CURRENCY_API_URL = 'https://api.frankfurter.app'
+CURRENCY_BASE = 'EUR'
+CURRENCY_REFRESH_INTERVAL = 60 * 60  # Refetch the rate table once an hour
+CURRENCY_TIMEOUT = 5
+# SQLite snapshot so restarts start with warm rates; set to '' to disable
+CURRENCY_SNAPSHOT_PATH = os.environ.get(
+    'CURRENCY_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'converter_rates.sqlite3')
+)
+
 # Redis configuration
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 REDIS_TIMEOUT = 30
 
+# Background job configuration
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'sqlite')  # sqlite or redis
+JOB_STORE_PATH = os.path.join(tempfile.gettempdir(), 'converter_jobs.sqlite3')
+JOB_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), 'converter_jobs')
+JOB_RESULT_TTL = 60 * 60  # Keep finished job results for one hour
+JOB_STORE_TIMEOUT = 10  # Seconds to wait for the SQLite job store's write lock
+
+# Metrics served on /metrics in the Prometheus text format. Stage timings
+# can also be returned on every response as a Server-Timing header.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+
+# Sampling profiler for conversion requests. When enabled, requests sent with
+# an X-Profile: 1 header are always profiled, and a PROFILE_SAMPLE_RATE share
+# of the rest are profiled and kept if they take PROFILE_SLOW_SECONDS or more.
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', 'false').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_SECONDS = 1.0
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_KEEP = 20  # Profiles kept per route
+
 # Flask configuration
 FLASK_DEBUG = True
 FLASK_PORT = 5000
@@ -0,0 +1,469 @@
+import re
+import zipfile
+from collections import namedtuple
+from docx import Document
+from lxml import etree
+from docx.shared import Pt
+import pdf_writer
+
+HEADING = 'heading'
+PARAGRAPH = 'paragraph'
+BULLET = 'bullet'
+NUMBER = 'number'
+QUOTE = 'quote'
+CODE = 'code'
+RULE = 'rule'
+
+LIST_KINDS = (BULLET, NUMBER)
+
+# A run is a piece of text with one set of inline styles
+Run = namedtuple('Run', ['text', 'bold', 'italic', 'code'])
+
+
+class Block(namedtuple('Block', ['kind', 'runs', 'level'])):
+    """One block of a document: a heading, paragraph, list item, quote, code block or rule.
+
+    level is the heading level for headings and 0 otherwise.
+    """
+
+    @property
+    def text(self):
+        return ''.join(run.text for run in self.runs)
+
+
+def plain(kind, text, level=0):
+    """Build a block from unformatted text."""
+    return Block(kind, [Run(text, False, False, kind == CODE)] if text else [], level)
+
+
+# Inline markup, tried left to right at each position
+_INLINE = re.compile(
+    r'\\([\\`*_{}\[\]()#+\-.!>])'               # 1: escaped character
+    r'|`([^`]+)`'                               # 2: code span
+    r'|\*\*(.+?)\*\*|(?<!\w)__(.+?)__(?!\w)'    # 3, 4: bold
+    r'|\*(?![\s*])(.+?)\*|(?<!\w)_(?![\s_])(.+?)_(?!\w)'  # 5, 6: italic
+    r'|!?\[([^\]]*)\]\([^)]*\)'                 # 7: link or image, keeps the label
+)
+
+
+def parse_inline(text, bold=False, italic=False):
+    """Split Markdown inline markup into styled runs."""
+    runs = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            runs.append(Run(text[position:match.start()], bold, italic, False))
+        escaped, code, strong, strong_alt, em, em_alt, label = match.groups()
+        if escaped is not None:
+            runs.append(Run(escaped, bold, italic, False))
+        elif code is not None:
+            runs.append(Run(code, bold, italic, True))
+        elif strong is not None or strong_alt is not None:
+            runs.extend(parse_inline(strong if strong is not None else strong_alt, True, italic))
+        elif em is not None or em_alt is not None:
+            runs.extend(parse_inline(em if em is not None else em_alt, bold, True))
+        else:
+            runs.extend(parse_inline(label, bold, italic))
+        position = match.end()
+    if position < len(text):
+        runs.append(Run(text[position:], bold, italic, False))
+    return runs
+
+
+_ATX_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:\s+(.*?))?(?:\s+#+)?\s*$')
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_BULLET_ITEM = re.compile(r'^\s*[-*+]\s+(.*)$')
+_NUMBER_ITEM = re.compile(r'^\s*\d{1,9}[.)]\s+(.*)$')
+_QUOTE_LINE = re.compile(r'^ {0,3}>\s?(.*)$')
+_RULE_LINE = re.compile(r'^ {0,3}([-*_])(?:\s*\1){2,}\s*$')
+_SETEXT = re.compile(r'^ {0,3}(=+|-+)\s*$')
+
+
+def parse_markdown(lines):
+    """Yield the blocks of a Markdown document in one pass over its lines.
+
+    Paragraphs, list items and quotes may span several lines; their lines are
+    joined with spaces before inline markup is parsed. Nested lists are
+    flattened and HTML is passed through as text.
+    """
+    kind = None     # kind of the block being collected
+    parts = []      # its lines
+    fence = None    # closing fence while inside a fenced code block
+
+    def flush():
+        if kind == CODE:
+            return Block(CODE, [Run('\n'.join(parts), False, False, True)], 0)
+        return Block(kind, parse_inline(' '.join(parts)), 0)
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if fence:
+            if line.strip().startswith(fence):
+                yield flush()
+                kind, parts, fence = None, [], None
+            else:
+                parts.append(line)
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            if kind:
+                yield flush()
+                kind, parts = None, []
+            continue
+
+        # Setext headings underline the paragraph above them
+        setext = _SETEXT.match(line)
+        if setext and kind == PARAGRAPH:
+            yield Block(HEADING, parse_inline(' '.join(parts)), 1 if setext.group(1)[0] == '=' else 2)
+            kind, parts = None, []
+            continue
+
+        match = _FENCE.match(line)
+        if match:
+            if kind:
+                yield flush()
+            kind, parts, fence = CODE, [], match.group(1)[0] * len(match.group(1))
+            continue
+
+        if _RULE_LINE.match(line):
+            if kind:
+                yield flush()
+            yield Block(RULE, [], 0)
+            kind, parts = None, []
+            continue
+
+        match = _ATX_HEADING.match(line)
+        if match:
+            if kind:
+                yield flush()
+            yield Block(HEADING, parse_inline(match.group(2) or ''), len(match.group(1)))
+            kind, parts = None, []
+            continue
+
+        match = _BULLET_ITEM.match(line) or _NUMBER_ITEM.match(line)
+        if match:
+            if kind:
+                yield flush()
+            kind = BULLET if match.re is _BULLET_ITEM else NUMBER
+            parts = [match.group(1)]
+            continue
+
+        match = _QUOTE_LINE.match(line)
+        if match:
+            if kind and kind != QUOTE:
+                yield flush()
+                kind, parts = None, []
+            kind = QUOTE
+            parts.append(match.group(1))
+            continue
+
+        # Anything else continues the open paragraph, item or quote
+        if kind is None:
+            kind = PARAGRAPH
+        parts.append(stripped)
+
+    if kind:
+        yield flush()
+
+
+def parse_text(lines):
+    """Yield one paragraph per line of a plain text document."""
+    for line in lines:
+        yield plain(PARAGRAPH, line.strip())
+
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+_OFFICE = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+_STYLE = '{urn:oasis:names:tc:opendocument:xmlns:style:1.0}'
+_FO = '{urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0}'
+
+
+def _merge_runs(runs):
+    """Join neighbouring runs that share a style."""
+    merged = []
+    for run in runs:
+        if not run.text:
+            continue
+        if merged and merged[-1][1:] == run[1:]:
+            merged[-1] = merged[-1]._replace(text=merged[-1].text + run.text)
+        else:
+            merged.append(run)
+    return merged
+
+
+def _release(element):
+    """Free a parsed element and the siblings before it so memory stays flat."""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _docx_style_names(archive):
+    """Map style IDs (e.g. Heading1) to display names (e.g. Heading 1)."""
+    try:
+        root = etree.fromstring(archive.read('word/styles.xml'))
+    except KeyError:
+        return {}
+    names = {}
+    for style in root.iter(_W + 'style'):
+        name = style.find(_W + 'name')
+        if name is not None:
+            names[style.get(_W + 'styleId')] = name.get(_W + 'val')
+    return names
+
+
+def _docx_flag(properties, tag):
+    if properties is None:
+        return False
+    element = properties.find(_W + tag)
+    return element is not None and element.get(_W + 'val', 'true') not in ('0', 'false', 'none')
+
+
+def _docx_kind(style, numbered):
+    """Classify a paragraph by its style name, the way the python-docx converters did."""
+    # Built-in styles are stored lower case, e.g. "heading 1"
+    style = style.lower()
+    if style.startswith('heading') and style[-1:].isdigit():
+        return HEADING, int(style[-1])
+    if style == 'title':
+        return HEADING, 1
+    if style.startswith('list number'):
+        return NUMBER, 0
+    if style.startswith('list bullet') or numbered:
+        return BULLET, 0
+    if style in ('quote', 'intense quote'):
+        return QUOTE, 0
+    return PARAGRAPH, 0
+
+
+def read_docx(path):
+    """Yield the paragraphs of a DOCX file as blocks, streaming word/document.xml.
+
+    Paragraphs inside tables are included in document order. Bold and italic
+    run formatting is kept; everything else is dropped.
+    """
+    with zipfile.ZipFile(path) as archive:
+        style_names = _docx_style_names(archive)
+        with archive.open('word/document.xml') as xml:
+            depth = 0  # paragraphs nest inside text boxes; only the outermost is emitted
+            for event, element in etree.iterparse(xml, events=('start', 'end'), tag=_W + 'p'):
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth:
+                    continue
+
+                properties = element.find(_W + 'pPr')
+                style_id = None
+                numbered = False
+                if properties is not None:
+                    style = properties.find(_W + 'pStyle')
+                    style_id = style.get(_W + 'val') if style is not None else None
+                    numbered = properties.find(_W + 'numPr') is not None
+                kind, level = _docx_kind(style_names.get(style_id, style_id or ''), numbered)
+
+                runs = []
+                for run in element.iter(_W + 'r'):
+                    run_properties = run.find(_W + 'rPr')
+                    bold, italic = _docx_flag(run_properties, 'b'), _docx_flag(run_properties, 'i')
+                    for child in run:
+                        if child.tag == _W + 't':
+                            runs.append(Run(child.text or '', bold, italic, False))
+                        elif child.tag == _W + 'tab':
+                            runs.append(Run('\t', bold, italic, False))
+                        elif child.tag in (_W + 'br', _W + 'cr'):
+                            runs.append(Run('\n', bold, italic, False))
+                yield Block(kind, _merge_runs(runs), level)
+
+                # Paragraphs are children of the body or of table cells
+                _release(element)
+                parent = element.getparent()
+                if parent is not None and parent.tag != _W + 'body':
+                    parent.remove(element)
+
+
+def _odt_text_styles(root, styles):
+    """Record which automatic text styles are bold or italic."""
+    for style in root.iter(_STYLE + 'style'):
+        properties = style.find(_STYLE + 'text-properties')
+        if properties is not None:
+            styles[style.get(_STYLE + 'name')] = (
+                properties.get(_FO + 'font-weight') == 'bold',
+                properties.get(_FO + 'font-style') == 'italic'
+            )
+
+
+def _odt_runs(element, styles, bold=False, italic=False):
+    """Yield the text runs of an ODT paragraph, expanding spaces, tabs and breaks."""
+    if element.text:
+        yield Run(element.text, bold, italic, False)
+    for child in element:
+        tag = child.tag
+        if tag == _TEXT + 'span':
+            child_bold, child_italic = styles.get(child.get(_TEXT + 'style-name'), (False, False))
+            yield from _odt_runs(child, styles, bold or child_bold, italic or child_italic)
+        elif tag == _TEXT + 's':
+            yield Run(' ' * int(child.get(_TEXT + 'c', '1')), bold, italic, False)
+        elif tag == _TEXT + 'tab':
+            yield Run('\t', bold, italic, False)
+        elif tag == _TEXT + 'line-break':
+            yield Run('\n', bold, italic, False)
+        elif tag in (_TEXT + 'note', _TEXT + 'bookmark', _TEXT + 'bookmark-start'):
+            pass
+        else:
+            # Links, fields and other inline wrappers contribute their text
+            yield from _odt_runs(child, styles, bold, italic)
+        if child.tail:
+            yield Run(child.tail, bold, italic, False)
+
+
+def read_odt(path):
+    """Yield the paragraphs and headings of an ODT file as blocks, streaming content.xml."""
+    blocks_tags = (_TEXT + 'p', _TEXT + 'h')
+    with zipfile.ZipFile(path) as archive:
+        styles = {}
+        if 'styles.xml' in archive.namelist():
+            _odt_text_styles(etree.fromstring(archive.read('styles.xml')), styles)
+        with archive.open('content.xml') as xml:
+            depth = 0       # paragraphs nest inside notes and frames; only the outermost is emitted
+            list_depth = 0
+            for event, element in etree.iterparse(xml, events=('start', 'end')):
+                tag = element.tag
+                if tag == _OFFICE + 'automatic-styles' and event == 'end':
+                    _odt_text_styles(element, styles)
+                elif tag == _TEXT + 'list-item':
+                    list_depth += 1 if event == 'start' else -1
+                elif tag in blocks_tags:
+                    if event == 'start':
+                        depth += 1
+                        continue
+                    depth -= 1
+                    if depth:
+                        continue
+                    if tag == _TEXT + 'h':
+                        kind, level = HEADING, int(element.get(_TEXT + 'outline-level', '1'))
+                    else:
+                        kind, level = (BULLET if list_depth else PARAGRAPH), 0
+                    yield Block(kind, _merge_runs(_odt_runs(element, styles)), level)
+
+                # Drop finished lists, tables and paragraphs along with everything before them
+                if event == 'end' and depth == 0:
+                    parent = element.getparent()
+                    if parent is not None and parent.tag == _OFFICE + 'text':
+                        _release(element)
+                    elif tag in blocks_tags:
+                        element.clear(keep_tail=True)
+
+
+def _list_markers(blocks):
+    """Pair each block with its list marker ('' outside lists) and whether the next block changes kind."""
+    number = 0
+    previous = None
+    for block in blocks:
+        if previous is not None:
+            yield previous + (block.kind != previous[0].kind,)
+        if block.kind == NUMBER:
+            number += 1
+            marker = f'{number}. '
+        else:
+            number = 0
+            marker = '* ' if block.kind == BULLET else ''
+        previous = (block, marker)
+    if previous is not None:
+        yield previous + (True,)
+
+
+def iter_txt(blocks):
+    """Yield the plain text rendering of blocks."""
+    for block, marker, list_end in _list_markers(blocks):
+        if block.kind in LIST_KINDS:
+            yield marker + block.text + ('\n\n' if list_end else '\n')
+        elif block.kind == RULE:
+            yield '\n'
+        else:
+            yield block.text + '\n\n'
+
+
+def _markdown_inline(runs):
+    out = []
+    for run in runs:
+        text = run.text
+        if run.code:
+            text = f'`{text}`'
+        if run.italic:
+            text = f'*{text}*'
+        if run.bold:
+            text = f'**{text}**'
+        out.append(text)
+    return ''.join(out)
+
+
+def iter_markdown(blocks):
+    """Yield the Markdown rendering of blocks."""
+    for block, marker, list_end in _list_markers(blocks):
+        if block.kind == HEADING:
+            yield '#' * block.level + ' ' + _markdown_inline(block.runs) + '\n\n'
+        elif block.kind in LIST_KINDS:
+            yield marker + _markdown_inline(block.runs) + ('\n\n' if list_end else '\n')
+        elif block.kind == QUOTE:
+            yield '> ' + _markdown_inline(block.runs) + '\n\n'
+        elif block.kind == CODE:
+            yield '```\n' + block.text + '\n```\n\n'
+        elif block.kind == RULE:
+            yield '---\n\n'
+        else:
+            yield _markdown_inline(block.runs) + '\n\n'
+
+
+def write_docx(blocks, output_path):
+    """Write blocks to a DOCX file using the default template's styles."""
+    doc = Document()
+    for block in blocks:
+        if block.kind == HEADING:
+            paragraph = doc.add_heading(level=min(block.level, 9))
+        elif block.kind == BULLET:
+            paragraph = doc.add_paragraph(style='List Bullet')
+        elif block.kind == NUMBER:
+            paragraph = doc.add_paragraph(style='List Number')
+        elif block.kind == QUOTE:
+            paragraph = doc.add_paragraph(style='Quote')
+        else:
+            paragraph = doc.add_paragraph()
+        for run in block.runs:
+            docx_run = paragraph.add_run(run.text)
+            docx_run.bold = run.bold or None
+            docx_run.italic = run.italic or None
+            if run.code:
+                docx_run.font.name = 'Courier New'
+                docx_run.font.size = Pt(10)
+    doc.save(output_path)
+
+
+def iter_pdf_blocks(blocks):
+    """Map blocks onto the (style, text) blocks understood by pdf_writer."""
+    for block, marker, _ in _list_markers(blocks):
+        if block.kind == HEADING:
+            yield f'h{min(block.level, 3)}', block.text
+        elif block.kind == BULLET:
+            yield 'li', block.text
+        elif block.kind == NUMBER:
+            yield 'ol', marker + block.text
+        elif block.kind == QUOTE:
+            yield 'quote', block.text
+        elif block.kind == CODE:
+            for line in block.text.split('\n'):
+                yield 'pre', line
+        elif block.kind == RULE:
+            yield 'p', ''
+        else:
+            yield 'p', block.text
+
+
+def write_pdf(blocks, output_path):
+    pdf_writer.write_pdf(iter_pdf_blocks(blocks), output_path)
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from config import EXECUTOR_POOLS, logger
+import metrics
+import profiler
+
+# Set in pool worker processes, where nested submissions run inline
+_in_worker = False
+
+
+class PoolBusy(Exception):
+    """Raised when a converter pool has no free worker or queue slot."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"The {name} converter is busy, try again in {retry_after} seconds")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    global _in_worker
+    _in_worker = True
+
+
+def _timed_call(func, args, kwargs, profile=False):
+    """Run func in a worker and report when it started, to measure queue wait.
+
+    The stages func times are returned too, so they reach the web process's
+    metrics. With profile set the worker also samples its own stack and
+    returns the counts, so profiled requests see where time goes inside the
+    pool.
+    """
+    started_at = time.time()
+    with metrics.collect_stages() as stages:
+        if profile:
+            result, stacks = profiler.profile_call(func, args, kwargs)
+        else:
+            result, stacks = func(*args, **kwargs), None
+    return started_at, result, stacks, stages
+
+
+class _PoolFuture(Future):
+    """Future for a pool task that unwraps _timed_call's result.
+
+    stages holds the (stage, seconds) pairs the task timed once it is done.
+    """
+
+    def __init__(self, inner):
+        super().__init__()
+        self._inner = inner
+        self.stages = []
+
+    def cancel(self):
+        # Cancelling the queued task cancels this future from its done callback
+        return self._inner.cancel()
+
+
+class ConverterPool:
+    """Process pool for one kind of conversion with a bounded queue.
+
+    At most workers + queue tasks are admitted at once. Beyond that submit()
+    raises PoolBusy, which the app turns into a 503 with Retry-After, unless
+    the caller asks to block for a slot instead, as streamed batches do once
+    their response has started.
+    """
+
+    def __init__(self, name, workers, queue, retry_after):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.retry_after = retry_after
+        self.submitted = 0
+        self.rejected = 0
+        self._active = 0
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        with self._lock:
+            # A forked child must not reuse its parent's pool
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+                self._pid = os.getpid()
+                logger.info(f"Started {self.name} converter pool with {self.workers} workers")
+            return self._executor
+
+    @property
+    def active(self):
+        """Number of tasks running or waiting on the pool."""
+        return self._active
+
+    def check(self):
+        """Raise PoolBusy if a task submitted now would be refused."""
+        if self._active >= self.workers + self.queue:
+            self._reject()
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise PoolBusy(self.name, self.retry_after)
+
+    def _release(self, future):
+        with self._lock:
+            self._active -= 1
+        self._slots.release()
+
+    def submit(self, func, *args, block=False, **kwargs):
+        """Queue func(*args, **kwargs) on the pool and return its Future."""
+        if _in_worker:
+            # Already inside a pool worker; run here rather than nesting pools
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(blocking=block):
+            self._reject()
+        with self._lock:
+            self._active += 1
+            self.submitted += 1
+        submitted_at = time.time()
+        route = metrics.current_route()
+        profile = profiler.current()
+        try:
+            inner = self._get_executor().submit(_timed_call, func, args, kwargs, profile is not None)
+        except Exception:
+            self._release(None)
+            raise
+        future = _PoolFuture(inner)
+
+        def finish(inner):
+            self._release(inner)
+            if inner.cancelled():
+                Future.cancel(future)
+                future.set_running_or_notify_cancel()
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                started_at, result, stacks, stages = inner.result()
+                metrics.record_pool_wait(self.name, max(0.0, started_at - submitted_at))
+                metrics.record_worker_stages(stages, route)
+                future.stages = stages
+                if stacks:
+                    profile.add_stacks(stacks, f'[{self.name} pool]')
+                future.set_result(result)
+
+        inner.add_done_callback(finish)
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Run func on the pool and wait for its result."""
+        with metrics.stage(f'{self.name}_pool'):
+            future = self.submit(func, *args, **kwargs)
+            result = future.result()
+        # Already observed when the task finished; this shows them in Server-Timing
+        metrics.add_server_timing(getattr(future, 'stages', []))
+        return result
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes; the next submit starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue': self.queue,
+                'active': self._active,
+                'submitted': self.submitted,
+                'rejected': self.rejected
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """Return the named converter pool configured in EXECUTOR_POOLS."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                settings = EXECUTOR_POOLS[name]
+                pool = ConverterPool(name, settings['workers'], settings['queue'], settings['retry_after'])
+                _pools[name] = pool
+    return pool
+
+
+def pool_stats():
+    """Return the stats of every pool created so far."""
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+
+def shutdown_pools(wait=True):
+    """Stop the worker processes of every pool; they are restarted on the next submit."""
+    for pool in list(_pools.values()):
+        pool.shutdown(wait)
@@ -1,8 +1,25 @@
-from flask import request, send_file, abort
+from flask import request, send_file, abort, Response
 from pydub import AudioSegment
 import io
-from utils import validate_file
+import tempfile
+from utils import validate_file, cleanup_temp_files, detach_upload, set_attachment
 from config import ALLOWED_AUDIO_EXTENSIONS, logger
+from cache import conversion_cache, file_digest
+from uploads import upload_path
+from executors import get_pool, PoolBusy
+import media
+import metrics
+
+# ffmpeg encoder and muxer for each target format when streaming
+STREAMING_ENCODERS = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'wav': ('pcm_s16le', 'wav'),
+    'ogg': ('libvorbis', 'ogg'),
+    'flac': ('flac', 'flac'),
+    'm4a': ('aac', 'ipod'),
+    'aac': ('aac', 'adts')
+}
+
 
 def handle_audio_conversion():
     try:
@@ -15,34 +32,96 @@ def handle_audio_conversion():
             abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}")
 
         original_filename = request.form.get('filename', 'converted_audio')
+        streaming = request.form.get('stream', 'false').lower() in ('1', 'true', 'yes')
 
         logger.info(f"Starting audio conversion: {filename} to {target_format}")
 
-        try:
-            # Read the audio file using pydub
-            audio = AudioSegment.from_file(audio_file)
+        # Serve a previous conversion of the same audio to the same format
+        cache_key = conversion_cache.make_key(
+            file_digest(audio_file), kind='audio', format=target_format.lower()
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype=f'audio/{target_format.lower()}',
+                as_attachment=True,
+                download_name=f'{original_filename}.{target_format.lower()}'
+            )
 
-            # Prepare output buffer
-            output_buffer = io.BytesIO()
+        if streaming:
+            return stream_audio_conversion(audio_file, target_format.lower(), original_filename, cache_key)
 
-            # Export the audio to the target format
-            audio.export(output_buffer, format=target_format.lower())
-            output_buffer.seek(0)
+        try:
+            # Convert on the audio pool, by path when the upload is on disk so
+            # pydub does not copy it into another temporary file for ffmpeg
+            source = upload_path(audio_file) or audio_file.read()
+            output = get_pool('audio').run(convert_audio, source, target_format.lower())
+            conversion_cache.put_bytes(cache_key, output)
 
             # Send the converted audio
             return send_file(
-                output_buffer,
+                io.BytesIO(output),
                 mimetype=f'audio/{target_format.lower()}',
                 as_attachment=True,
                 download_name=f'{original_filename}.{target_format.lower()}'
             )
 
+        except PoolBusy:
+            raise
         except Exception as e:
             error_msg = f"Error during audio conversion: {str(e)}"
             logger.error(error_msg)
             return {"error": error_msg}, 500
 
+    except PoolBusy:
+        raise
     except Exception as e:
         error_msg = f"Error processing audio request: {str(e)}"
         logger.error(error_msg)
-        return {"error": error_msg}, 500
\ No newline at end of file
+        return {"error": error_msg}, 500
+
+
+def convert_audio(source, target_format):
+    """Decode audio from a path or bytes with pydub and return it encoded as target_format."""
+    with metrics.stage('decode'):
+        audio = AudioSegment.from_file(io.BytesIO(source) if isinstance(source, bytes) else source)
+    with metrics.stage('encode'):
+        output_buffer = io.BytesIO()
+        audio.export(output_buffer, format=target_format)
+        return output_buffer.getvalue()
+
+
+def stream_audio_conversion(audio_file, target_format, original_filename, cache_key):
+    """Pipe the upload through ffmpeg and stream the encoded audio back in chunks."""
+    encoder, muxer = STREAMING_ENCODERS[target_format]
+    # ffmpeg reads spooled uploads by path, since containers such as M4A with
+    # their index at the end cannot be demuxed from a pipe
+    input_path = upload_path(audio_file)
+    args = ['-i', input_path or 'pipe:0', '-vn', '-c:a', encoder, '-f', muxer]
+    if muxer == 'ipod':
+        # MP4 normally rewrites its header at the end; fragment it so it can go to a pipe
+        args += ['-movflags', 'frag_keyframe+empty_moov']
+    args.append('pipe:1')
+
+    source = detach_upload(audio_file)
+
+    def generate():
+        # Keep a copy of what was streamed so the next request can be served from the cache
+        copy = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{target_format}')
+        try:
+            for chunk in media.stream_ffmpeg(args, None if input_path else source):
+                copy.write(chunk)
+                yield chunk
+            copy.close()
+            conversion_cache.put_file(cache_key, copy.name)
+        except Exception as e:
+            # Headers are already sent, so the client only sees a truncated body
+            logger.error(f"Error during streaming audio conversion: {str(e)}")
+        finally:
+            source.close()
+            copy.close()
+            cleanup_temp_files([copy.name])
+
+    response = Response(generate(), mimetype=f'audio/{target_format}')
+    return set_attachment(response, f'{original_filename}.{target_format}')
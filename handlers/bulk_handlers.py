@@ -0,0 +1,63 @@
+from flask import jsonify
+import numpy as np
+from units import UNITS
+
+
+def _get_category(name):
+    if name not in UNITS:
+        raise KeyError(f"Unknown category: {name}. Available: {', '.join(sorted(UNITS))}")
+    return UNITS[name]
+
+
+def _convert_items(items, default_category):
+    """Convert value/from/to triples, grouping them by category for one pass each."""
+    groups = {}
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            category = item.get('category', default_category)
+            value, from_unit, to_unit = item['value'], item['from_unit'], item['to_unit']
+        else:
+            value, from_unit, to_unit = item[:3]
+            category = item[3] if len(item) > 3 else default_category
+        group = groups.setdefault(category, ([], [], [], []))
+        group[0].append(position)
+        group[1].append(value)
+        group[2].append(from_unit)
+        group[3].append(to_unit)
+
+    results = np.empty(len(items), dtype=np.float64)
+    for category, (positions, values, from_units, to_units) in groups.items():
+        results[positions] = _get_category(category).convert_many(values, from_units, to_units)
+    return results
+
+
+def convert_bulk(data):
+    """Convert many values in one request.
+
+    Accepts either {"category", "values", "from_unit", "to_unit"} to convert an
+    array between one pair of units, or {"items": [...]} where each item is a
+    {"value", "from_unit", "to_unit"} object or [value, from_unit, to_unit]
+    triple, optionally with its own category.
+    """
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+
+        if 'items' in data:
+            results = _convert_items(data['items'], data.get('category'))
+        else:
+            values = np.atleast_1d(np.asarray(data['values'], dtype=np.float64))
+            if values.ndim != 1:
+                raise ValueError("values must be a flat list of numbers")
+            results = _get_category(data.get('category')).convert(values, data['from_unit'], data['to_unit'])
+
+        return jsonify({
+            'success': True,
+            'results': results.tolist(),
+            'count': len(results)
+        })
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
@@ -1,5 +1,6 @@
 from flask import jsonify
 import colorsys
+import colors
 
 def hex_to_rgb(hex_color):
     """Convert HEX color to RGB."""
@@ -85,3 +86,71 @@ def convert_color(value, from_format, to_format):
             'success': False,
             'error': str(e)
         }), 400
+
+
+def _palette_items(palette):
+    """Normalize a {name: color} palette, accepting [r, g, b] lists as well as strings."""
+    if not isinstance(palette, dict) or not palette:
+        raise ValueError("palette must be a non-empty object of name: color pairs")
+    return tuple(
+        (str(name), value if isinstance(value, str) else ','.join(map(str, value)))
+        for name, value in palette.items()
+    )
+
+
+def convert_color_bulk(data):
+    """Convert many colors in one request.
+
+    Colors are given as "colors", a list in from_format; as "palette", an
+    object of name: color pairs in from_format, or in CSS notation when
+    from_format is omitted; or as "css", a stylesheet whose color literals are
+    extracted. They are converted to to_format (hex, rgb, hsl, cmyk, lab or
+    oklab) in one vectorized pass. With "nearest" set to "css" or to a
+    palette object, each color is also matched to the perceptually closest
+    palette entry.
+    """
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        to_format = data.get('to_format', 'hex')
+        from_format = data.get('from_format')
+
+        names = None
+        if 'css' in data:
+            names, values = colors.extract_css_colors(data['css'])
+            rgb = colors.parse_mixed(values)
+        elif 'palette' in data:
+            items = _palette_items(data['palette'])
+            names, values = [name for name, _ in items], [value for _, value in items]
+            rgb = colors.parse_colors(values, from_format) if from_format else colors.parse_mixed(values)
+        else:
+            values = data['colors']
+            if not isinstance(values, list):
+                raise ValueError("colors must be a list")
+            rgb = colors.parse_colors(values, from_format or 'hex')
+
+        results = colors.format_colors(rgb, to_format)
+        response = {
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'to_format': to_format
+        }
+        if names is not None:
+            response['names'] = names
+
+        nearest = data.get('nearest')
+        if nearest:
+            index = colors.palette_index(None if nearest == 'css' else _palette_items(nearest))
+            positions, distances = index.nearest(rgb)
+            response['nearest'] = [
+                {'name': index.names[position], 'distance': round(distance, 4)}
+                for position, distance in zip(positions.tolist(), distances.tolist())
+            ]
+
+        return jsonify(response)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
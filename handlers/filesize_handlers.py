@@ -1,25 +1,13 @@
 from flask import jsonify
+from units import UNITS
 
 def convert_filesize(value, from_unit, to_unit):
-    # Base conversion to bytes
-    base_rates = {
-        'b': 1,
-        'kb': 1024,
-        'mb': 1024 * 1024,
-        'gb': 1024 * 1024 * 1024,
-        'tb': 1024 * 1024 * 1024 * 1024,
-        'pb': 1024 * 1024 * 1024 * 1024 * 1024
-    }
-    
     try:
         # Convert input to float
         value = float(value)
         
-        # Convert to base unit (bytes)
-        base_value = value * base_rates[from_unit.lower()]
-        
-        # Convert from base unit to target unit
-        result = base_value / base_rates[to_unit.lower()]
+        # Convert with the precomputed factor (base unit: bytes)
+        result = UNITS['filesize'].convert(value, from_unit, to_unit)
         
         return jsonify({
             'success': True,
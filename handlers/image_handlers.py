@@ -1,41 +1,130 @@
-from flask import request, send_file, abort
+from flask import request, send_file, abort, Response, jsonify
+from werkzeug.exceptions import HTTPException
 from PIL import Image
+from concurrent.futures import wait, FIRST_COMPLETED
 import io
+import json
+import numpy as np
+import os
+import zipfile
 import pillow_heif
 import pillow_avif
-from utils import validate_file
-from config import ALLOWED_IMAGE_EXTENSIONS, logger
+from utils import validate_file, detach_upload
+from config import ALLOWED_IMAGE_EXTENSIONS, IMAGE_BATCH_MAX_FILES, logger
+from cache import conversion_cache, file_digest
+from uploads import IngestedUpload, upload_path
+from executors import get_pool, PoolBusy
+import colors
+import metrics
 
 # Register HEIF opener with Pillow
 pillow_heif.register_heif_opener()
 
-def handle_image_conversion():
+# How max_width/max_height are applied: fit inside the box, fill it and crop, or stretch to it
+FIT_MODES = {'contain', 'cover', 'stretch'}
+
+# Palettes are computed from the image shrunk to fit this box, then from at most this many pixels of it
+PALETTE_SAMPLE_SIDE = 256
+PALETTE_SAMPLE_PIXELS = 20000
+PALETTE_MAX_COLORS = 16
+
+def parse_image_options():
+    """Read and validate the target format, compression and resize options from the form."""
+    target_format = request.form.get('format')
+    if not target_format or target_format.lower() not in ALLOWED_IMAGE_EXTENSIONS:
+        abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}")
+
+    compression = request.form.get('compression', '95')
     try:
-        # Get and validate the image file
-        image_file = request.files.get('image')
-        filename = validate_file(image_file, ALLOWED_IMAGE_EXTENSIONS)
-        
-        target_format = request.form.get('format')
-        if not target_format or target_format.lower() not in ALLOWED_IMAGE_EXTENSIONS:
-            abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}")
-            
-        compression = request.form.get('compression', '95')
-        try:
-            compression = int(compression)
-            if not (0 <= compression <= 100):
-                raise ValueError
-        except ValueError:
-            compression = 95
-            
-        original_filename = request.form.get('filename', 'converted_image')
-        
-        logger.info(f"Starting image conversion: {filename} to {target_format}")
+        compression = int(compression)
+        if not (0 <= compression <= 100):
+            raise ValueError
+    except ValueError:
+        compression = 95
+
+    resize = {'fit': request.form.get('fit', 'contain').lower()}
+    if resize['fit'] not in FIT_MODES:
+        abort(400, description=f"Invalid fit. Allowed values: {', '.join(sorted(FIT_MODES))}")
+    for field in ('max_width', 'max_height'):
+        value = request.form.get(field)
+        if value:
+            try:
+                resize[field] = int(value)
+                if resize[field] <= 0:
+                    raise ValueError
+            except ValueError:
+                abort(400, description=f"{field} must be a positive integer")
+
+    return target_format.lower(), compression, resize
+
+
+def _target_size(width, height, max_width, max_height, fit):
+    """Return the size to scale to before any cropping, never upscaling."""
+    if fit == 'stretch':
+        return (max_width or width, max_height or height)
+
+    scales = []
+    if max_width:
+        scales.append(max_width / width)
+    if max_height:
+        scales.append(max_height / height)
+    # cover only differs from contain when both dimensions are bounded
+    scale = max(scales) if fit == 'cover' and len(scales) == 2 else min(scales)
+    if scale >= 1:
+        return (width, height)
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def downscale_image(image, max_width=None, max_height=None, fit='contain'):
+    """Decode an opened, not yet loaded, image and shrink it, decoding at reduced scale where possible."""
+    size = None
+    if max_width or max_height:
+        size = _target_size(image.width, image.height, max_width, max_height, fit)
+        if size == image.size:
+            size = None
+    # Let the JPEG decoder skip DCT coefficients and produce a 1/2, 1/4 or 1/8 scale image
+    if size and image.format == 'JPEG':
+        image.draft(None, size)
+    with metrics.stage('decode'):
+        image.load()
+
+    if size:
+        with metrics.stage('resize'):
+            if image.mode in ('1', 'P'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            # Cheap box reduction by an integer factor, then a high quality resample for the rest
+            factor = min(image.width // size[0], image.height // size[1])
+            if factor >= 2:
+                image = image.reduce(factor)
+            image = image.resize(size, Image.LANCZOS)
+
+    if fit == 'cover' and max_width and max_height:
+        left = max(0, (image.width - max_width) // 2)
+        top = max(0, (image.height - max_height) // 2)
+        image = image.crop((left, top, left + min(max_width, image.width), top + min(max_height, image.height)))
 
-        # Read the image using PIL
-        image = Image.open(image_file)
+    return image
 
+
+def convert_image(source, target_format, compression=95, max_width=None, max_height=None, fit='contain'):
+    """Convert an image (file-like object or bytes) and return the encoded bytes."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    # Read the image using PIL
+    image = Image.open(source)
+
+    # Resample before flattening so the flatten and encode work on fewer pixels
+    image = downscale_image(image, max_width, max_height, fit)
+    return encode_image(image, target_format, compression)
+
+
+def encode_image(image, target_format, compression=95):
+    """Encode an opened image in target_format and return the bytes."""
+    with metrics.stage('encode'):
         # Convert RGBA to RGB if needed
-        if image.mode == 'RGBA' and target_format.lower() in ['jpg', 'heic']:
+        if image.mode == 'RGBA' and target_format in ['jpg', 'heic']:
             background = Image.new('RGB', image.size, (255, 255, 255))
             background.paste(image, mask=image.split()[3])
             image = background
@@ -44,34 +133,265 @@ def handle_image_conversion():
         output_buffer = io.BytesIO()
 
         # Save the converted image to the buffer
-        if target_format.lower() == 'jpg':
+        if target_format == 'jpg':
             image.save(output_buffer, 'JPEG', quality=compression)
-        elif target_format.lower() == 'heic':
+        elif target_format == 'heic':
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             pillow_heif.save(output_buffer, image, quality=compression)
-        elif target_format.lower() == 'avif':
+        elif target_format == 'avif':
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             image.save(output_buffer, 'AVIF', quality=compression, speed=6)
-        elif target_format.lower() == 'tiff':
+        elif target_format == 'tiff':
             image.save(output_buffer, 'TIFF', compression='tiff_lzw')
-        elif target_format.lower() == 'bmp':
+        elif target_format == 'bmp':
             image.save(output_buffer, 'BMP')
         else:
             image.save(output_buffer, target_format.upper())
 
-        output_buffer.seek(0)
+        return output_buffer.getvalue()
+
+
+def extract_palette(source, count=5):
+    """Return the count dominant colors of an image as (sRGB colors, pixel shares) arrays.
+
+    Large JPEGs are decoded at reduced scale and only a fixed-size random
+    sample of pixels is clustered, so the cost barely grows with resolution.
+    Mostly transparent pixels are ignored.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    image = downscale_image(Image.open(source), PALETTE_SAMPLE_SIDE, PALETTE_SAMPLE_SIDE)
+    pixels = np.asarray(image.convert('RGBA')).reshape(-1, 4)
+    opaque = pixels[pixels[:, 3] >= 128]
+    pixels = (opaque if len(opaque) else pixels)[:, :3]
+    if len(pixels) > PALETTE_SAMPLE_PIXELS:
+        pixels = pixels[np.random.default_rng(0).choice(len(pixels), PALETTE_SAMPLE_PIXELS, replace=False)]
+    return colors.dominant_colors(pixels, count)
+
+
+def handle_image_palette():
+    try:
+        image_file = request.files.get('image')
+        filename = validate_file(image_file, ALLOWED_IMAGE_EXTENSIONS)
+
+        to_format = request.form.get('to_format', 'hex').lower()
+        if to_format not in colors.COLOR_FORMATS:
+            abort(400, description=f"Invalid color format. Allowed formats: {', '.join(colors.COLOR_FORMATS)}")
+        try:
+            count = int(request.form.get('colors', '5'))
+            if not (1 <= count <= PALETTE_MAX_COLORS):
+                raise ValueError
+        except ValueError:
+            abort(400, description=f"colors must be an integer from 1 to {PALETTE_MAX_COLORS}")
+
+        logger.info(f"Extracting {count} color palette from {filename}")
+
+        # Palettes are cached as JSON like other results
+        cache_key = conversion_cache.make_key(file_digest(image_file), kind='image-palette', colors=count)
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            with open(cached_path, encoding='utf-8') as f:
+                palette = json.load(f)
+        else:
+            source = upload_path(image_file) or image_file.read()
+            rgb, shares = get_pool('image').run(extract_palette, source, count)
+            palette = {'rgb': rgb.tolist(), 'shares': shares.tolist()}
+            conversion_cache.put_bytes(cache_key, json.dumps(palette).encode('utf-8'))
+
+        values = colors.format_colors(np.array(palette['rgb']).reshape(-1, 3), to_format)
+        return jsonify({
+            'success': True,
+            'palette': [
+                {'color': value, 'share': round(share, 4)}
+                for value, share in zip(values, palette['shares'])
+            ],
+            'to_format': to_format
+        })
+
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error extracting palette: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
+
+
+def handle_image_conversion():
+    try:
+        # Get and validate the image file
+        image_file = request.files.get('image')
+        filename = validate_file(image_file, ALLOWED_IMAGE_EXTENSIONS)
+
+        target_format, compression, resize = parse_image_options()
+        original_filename = request.form.get('filename', 'converted_image')
+
+        logger.info(f"Starting image conversion: {filename} to {target_format}")
+
+        # Serve a previous conversion of the same image with the same options
+        cache_key = conversion_cache.make_key(
+            file_digest(image_file), kind='image',
+            format=target_format, compression=compression, **resize
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype=f'image/{target_format}',
+                as_attachment=True,
+                download_name=f'{original_filename}.{target_format}'
+            )
+
+        # Convert on the image pool, handing it the upload's path when it is on disk
+        source = upload_path(image_file) or image_file.read()
+        output = get_pool('image').run(convert_image, source, target_format, compression, **resize)
+        conversion_cache.put_bytes(cache_key, output)
 
         # Send the converted image
         return send_file(
-            output_buffer,
-            mimetype=f'image/{target_format.lower()}',
+            io.BytesIO(output),
+            mimetype=f'image/{target_format}',
             as_attachment=True,
-            download_name=f'{original_filename}.{target_format.lower()}'
+            download_name=f'{original_filename}.{target_format}'
         )
 
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Error converting image: {str(e)}"
         logger.error(error_msg)
-        return {"error": error_msg}, 500
\ No newline at end of file
+        return {"error": error_msg}, 500
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, non-seekable sink that lets a ZipFile be streamed out in pieces."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        """Return and clear everything written since the last call."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def handle_batch_image_conversion():
+    try:
+        image_files = request.files.getlist('images')
+        if not image_files:
+            abort(400, description="No images provided")
+        if len(image_files) > IMAGE_BATCH_MAX_FILES:
+            abort(400, description=f"Too many images. At most {IMAGE_BATCH_MAX_FILES} per batch")
+
+        target_format, compression, resize = parse_image_options()
+
+        # Validate everything up front so a bad file fails the request before streaming starts
+        items = []
+        for image_file in image_files:
+            filename = validate_file(image_file, ALLOWED_IMAGE_EXTENSIONS)
+            cache_key = conversion_cache.make_key(
+                file_digest(image_file), kind='image',
+                format=target_format, compression=compression, **resize
+            )
+            items.append((filename, cache_key, detach_upload(image_file)))
+
+        logger.info(f"Starting batch image conversion: {len(items)} images to {target_format}")
+
+        # Turn the batch away now if the pool is saturated; once streaming it waits for slots
+        get_pool('image').check()
+
+        return Response(
+            _stream_batch(items, target_format, compression, resize),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename="converted_images.zip"'}
+        )
+
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error converting images: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
+
+
+def _stream_batch(items, target_format, compression, resize):
+    """Convert items on the image pool and yield ZIP bytes as each image finishes."""
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED)
+    pool = get_pool('image')
+    # Bound the number of images held in memory at once
+    max_pending = pool.workers * 2
+    pending = {}
+    used_names = set()
+    errors = {}
+    remaining = iter(items)
+
+    def archive_name(filename):
+        stem = os.path.splitext(filename)[0] or 'image'
+        name, counter = f'{stem}.{target_format}', 1
+        while name in used_names:
+            name = f'{stem}_{counter}.{target_format}'
+            counter += 1
+        used_names.add(name)
+        return name
+
+    try:
+        while True:
+            # Serve cache hits inline and keep the pool topped up with the rest
+            for filename, cache_key, stream in remaining:
+                cached_path = conversion_cache.get(cache_key)
+                if cached_path:
+                    stream.close()
+                    archive.write(cached_path, archive_name(filename))
+                    yield sink.take()
+                    continue
+
+                # Hand workers the path of uploads already on disk rather than their bytes
+                source = stream.name if isinstance(stream, IngestedUpload) else stream.read()
+                future = pool.submit(convert_image, source, target_format, compression, block=True, **resize)
+                pending[future] = (filename, cache_key, stream)
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, cache_key, stream = pending.pop(future)
+                stream.close()
+                try:
+                    output = future.result()
+                except Exception as e:
+                    logger.error(f"Error converting image {filename}: {str(e)}")
+                    errors[filename] = str(e)
+                    continue
+                conversion_cache.put_bytes(cache_key, output)
+                archive.writestr(archive_name(filename), output)
+                yield sink.take()
+
+        if errors:
+            archive.writestr('errors.json', json.dumps(errors, indent=2))
+        archive.close()
+        yield sink.take()
+    finally:
+        for future in pending:
+            future.cancel()
+        for _, _, stream in items:
+            stream.close()
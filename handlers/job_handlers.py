@@ -0,0 +1,39 @@
+from flask import send_file, jsonify, url_for
+import os
+import jobs
+
+
+def handle_job_status(job_id):
+    """Report the state and progress of a background job."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+    response = {
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job.get('progress', 0),
+        'error': job.get('error')
+    }
+    if job['status'] == jobs.JOB_DONE:
+        response['download_url'] = url_for('job_download', job_id=job_id)
+    return jsonify(response)
+
+
+def handle_job_download(job_id):
+    """Serve the output of a finished background job."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    if job['status'] != jobs.JOB_DONE:
+        return jsonify({'success': False, 'error': f"Job is {job['status']}"}), 409
+    if not os.path.exists(job['output_path']):
+        return jsonify({'success': False, 'error': 'Job result has expired'}), 410
+
+    return send_file(
+        job['output_path'],
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=job['download_name']
+    )
@@ -1,27 +1,13 @@
 from flask import jsonify
+from units import UNITS
 
 def convert_length(value, from_unit, to_unit):
-    # Base conversion to meters
-    base_rates = {
-        'km': 1000,
-        'm': 1,
-        'cm': 0.01,
-        'mm': 0.001,
-        'mi': 1609.344,
-        'yd': 0.9144,
-        'ft': 0.3048,
-        'in': 0.0254
-    }
-    
     try:
         # Convert input to float
         value = float(value)
         
-        # Convert to base unit (meters)
-        base_value = value * base_rates[from_unit.lower()]
-        
-        # Convert from base unit to target unit
-        result = base_value / base_rates[to_unit.lower()]
+        # Convert with the precomputed factor (base unit: meters)
+        result = UNITS['length'].convert(value, from_unit, to_unit)
         
         return jsonify({
             'success': True,
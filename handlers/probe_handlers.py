@@ -0,0 +1,146 @@
+from flask import request, jsonify
+from werkzeug.exceptions import HTTPException
+from PIL import Image
+from PyPDF2 import PdfReader
+from lxml import etree
+import json
+import os
+import zipfile
+import pillow_avif
+from utils import validate_file, cleanup_temp_files, create_temp_file
+from config import (
+    ALLOWED_IMAGE_EXTENSIONS, ALLOWED_AUDIO_EXTENSIONS, ALLOWED_VIDEO_EXTENSIONS, ALLOWED_TEXT_EXTENSIONS, logger
+)
+from cache import conversion_cache, file_digest
+import media
+
+ALLOWED_PROBE_EXTENSIONS = (
+    ALLOWED_IMAGE_EXTENSIONS | ALLOWED_AUDIO_EXTENSIONS | ALLOWED_VIDEO_EXTENSIONS | ALLOWED_TEXT_EXTENSIONS
+)
+
+# Page counts saved by word processors in the documents' metadata parts
+_DOCX_PAGES = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}Pages'
+_ODT_STATISTIC = '{urn:oasis:names:tc:opendocument:xmlns:meta:1.0}document-statistic'
+_ODT_PAGE_COUNT = '{urn:oasis:names:tc:opendocument:xmlns:meta:1.0}page-count'
+
+
+def probe_image(source):
+    """Read an image's format, size and mode without decoding its pixels."""
+    with Image.open(source) as image:
+        return {
+            'kind': 'image',
+            'format': image.format,
+            'width': image.width,
+            'height': image.height,
+            'mode': image.mode,
+            'frames': getattr(image, 'n_frames', 1),
+            'has_alpha': image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        }
+
+
+def probe_av(path, kind):
+    """Read duration, bitrate and stream details from a media file's headers."""
+    info = media.probe_media(path)
+    result = {'kind': kind, 'format': info['format'], 'duration': info['duration'], 'bitrate': info['bitrate']}
+    video = media.first_stream(info, 'video')
+    if video:
+        result['video'] = {key: video[key] for key in ('codec', 'width', 'height', 'fps', 'bitrate')}
+    audio = media.first_stream(info, 'audio')
+    if audio:
+        result['audio'] = {key: audio[key] for key in ('codec', 'sample_rate', 'channels', 'bitrate')}
+    result['streams'] = info['streams']
+    return result
+
+
+def probe_pdf(source):
+    """Read a PDF's page count and document info from its cross-reference table and trailer."""
+    reader = PdfReader(source)
+    result = {'kind': 'document', 'format': 'pdf', 'encrypted': reader.is_encrypted}
+    if reader.is_encrypted:
+        return result
+
+    result['pages'] = len(reader.pages)
+    metadata = reader.metadata or {}
+    for field in ('title', 'author'):
+        value = metadata.get(f'/{field.title()}')
+        result[field] = str(value) if value is not None else None
+    if result['pages']:
+        box = reader.pages[0].mediabox
+        result['page_width'] = float(box.width)
+        result['page_height'] = float(box.height)
+    return result
+
+
+def probe_office(source, extension):
+    """Read the page count a word processor stored in a DOCX or ODT file, if any."""
+    result = {'kind': 'document', 'format': extension, 'pages': None}
+    with zipfile.ZipFile(source) as archive:
+        try:
+            if extension == 'docx':
+                pages = etree.fromstring(archive.read('docProps/app.xml')).find(_DOCX_PAGES)
+                result['pages'] = int(pages.text) if pages is not None else None
+            else:
+                statistic = etree.fromstring(archive.read('meta.xml')).find(f'.//{_ODT_STATISTIC}')
+                pages = statistic.get(_ODT_PAGE_COUNT) if statistic is not None else None
+                result['pages'] = int(pages) if pages else None
+        except (KeyError, ValueError, etree.XMLSyntaxError):
+            # Files written by other tools often leave the statistics out
+            pass
+    return result
+
+
+def probe_file(file, filename):
+    """Return what can be learned about an upload from its headers alone."""
+    extension = filename.rsplit('.', 1)[-1].lower()
+    stream = getattr(file, 'stream', file)
+
+    if extension in ALLOWED_IMAGE_EXTENSIONS:
+        return probe_image(stream)
+    if extension == 'pdf':
+        return probe_pdf(stream)
+    if extension in ('docx', 'odt'):
+        return probe_office(stream, extension)
+    if extension in ALLOWED_TEXT_EXTENSIONS:
+        return {'kind': 'document', 'format': extension}
+
+    # ffmpeg needs a path; large uploads are already on disk
+    input_path = create_temp_file(file, suffix=f'.{extension}')
+    try:
+        kind = 'video' if extension in ALLOWED_VIDEO_EXTENSIONS else 'audio'
+        return probe_av(input_path, kind)
+    finally:
+        cleanup_temp_files([input_path])
+
+
+def handle_probe():
+    """Describe an uploaded file without converting it."""
+    try:
+        upload = request.files.get('file')
+        filename = validate_file(upload, ALLOWED_PROBE_EXTENSIONS)
+        upload.stream.seek(0, os.SEEK_END)
+        size = upload.stream.tell()
+        upload.stream.seek(0)
+
+        # Probes are cached as JSON under the file's content hash
+        cache_key = conversion_cache.make_key(file_digest(upload), kind='probe', extension=filename.rsplit('.', 1)[-1])
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            with open(cached_path, encoding='utf-8') as f:
+                result = json.load(f)
+        else:
+            try:
+                result = probe_file(upload, filename)
+            except Exception as e:
+                logger.warning(f"Could not probe {filename}: {str(e)}")
+                return jsonify({'success': False, 'error': f"Could not read {filename}"}), 400
+            conversion_cache.put_bytes(cache_key, json.dumps(result).encode('utf-8'))
+
+        result.update(success=True, filename=filename, size=size)
+        return jsonify(result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error probing file: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
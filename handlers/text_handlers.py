@@ -1,15 +1,24 @@
-from flask import request, send_file, abort
+from flask import request, send_file, abort, Response
+from werkzeug.exceptions import HTTPException
 from docx import Document
-from PyPDF2 import PdfReader, PdfWriter
-from odf.opendocument import OpenDocumentText
-from odf import text as odf_text
-import markdown
-from docx2pdf import convert
 import tempfile
+import itertools
 import os
-import io
+from functools import partial
 from utils import validate_file, cleanup_temp_files, cleanup_temp_dir
 from config import ALLOWED_TEXT_EXTENSIONS, logger
+from cache import conversion_cache, file_digest
+from uploads import move_upload
+from executors import get_pool, PoolBusy
+import metrics
+from pdf_text import iter_page_text, parse_page_range, page_count
+from document import (
+    PARAGRAPH, plain, parse_markdown, parse_text, read_docx, read_odt,
+    iter_txt, iter_markdown, write_docx, write_pdf
+)
+
+# Characters per piece when streaming text output
+STREAM_CHUNK_SIZE = 64 * 1024
 
 def handle_text_conversion():
     temp_files = []  # Keep track of temporary files
@@ -23,6 +32,23 @@ def handle_text_conversion():
         if not target_format or target_format.lower() not in ALLOWED_TEXT_EXTENSIONS:
             abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_TEXT_EXTENSIONS)}")
 
+        # Optional 1-based page range for PDF sources, e.g. "1-5,8"
+        pages = request.form.get('pages') or None
+
+        # The converters dispatch on the source extension, so it is part of the key
+        cache_key = conversion_cache.make_key(
+            file_digest(text_file), kind='text',
+            source=filename.rsplit('.', 1)[-1].lower(), format=target_format, pages=pages
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype=f'application/{target_format}',
+                as_attachment=True,
+                download_name=f'converted_document.{target_format}'
+            )
+
         # Create temporary directory for all temporary files
         temp_dir = tempfile.mkdtemp()
         temp_input_path = os.path.join(temp_dir, f'input.{filename.split(".")[-1]}')
@@ -30,31 +56,37 @@ def handle_text_conversion():
         temp_files.extend([temp_input_path, temp_output_path])
         
         try:
-            # Save input file
-            text_file.save(temp_input_path)
-
-            # Convert based on input and target formats
-            if target_format == 'txt':
-                convert_to_txt(filename, temp_input_path, temp_output_path)
-            elif target_format == 'docx':
-                convert_to_docx(filename, temp_input_path, temp_output_path)
-            elif target_format == 'pdf':
-                convert_to_pdf(filename, temp_input_path, temp_output_path, temp_dir, temp_files)
-            elif target_format == 'md':
-                convert_to_md(filename, temp_input_path, temp_output_path)
-
-            # Create a copy of the output file in memory
-            with open(temp_output_path, 'rb') as f:
-                file_content = io.BytesIO(f.read())
-                file_content.seek(0)
-
-            # Send the file from memory
-            return send_file(
-                file_content,
-                mimetype=f'application/{target_format}',
-                as_attachment=True,
-                download_name=f'converted_document.{target_format}'
-            )
+            # Move the uploaded file into place; large uploads are not copied
+            move_upload(text_file, temp_input_path)
+
+            # Resolve the page range before converting so a bad one is rejected up front
+            if filename.endswith('.pdf'):
+                try:
+                    pages = parse_page_range(pages, page_count(temp_input_path))
+                except ValueError as e:
+                    abort(400, description=str(e))
+
+            # Text outputs are produced as chunks and streamed while they are generated
+            if target_format in ('txt', 'md'):
+                if target_format == 'txt':
+                    chunks = convert_to_txt(filename, temp_input_path, pages)
+                else:
+                    chunks = convert_to_md(filename, temp_input_path, pages)
+                response = stream_text(chunks, temp_output_path, target_format, cache_key)
+            else:
+                if target_format == 'docx':
+                    get_pool('text').run(convert_to_docx, filename, temp_input_path, temp_output_path, pages)
+                elif target_format == 'pdf':
+                    get_pool('text').run(convert_to_pdf, filename, temp_input_path, temp_output_path)
+                conversion_cache.put_file(cache_key, temp_output_path)
+
+                response = stream_file(temp_output_path, target_format)
+
+            # Remove the temporary directory once the response has been sent
+            response.call_on_close(partial(cleanup_temp_dir, temp_dir))
+            # The response owns the temporary directory from here on
+            temp_files, temp_dir = [], None
+            return response
 
         finally:
             # Clean up files and directory
@@ -62,6 +94,11 @@ def handle_text_conversion():
             if temp_dir:
                 cleanup_temp_dir(temp_dir)
 
+    except (PoolBusy, HTTPException):
+        cleanup_temp_files(temp_files)
+        if temp_dir:
+            cleanup_temp_dir(temp_dir)
+        raise
     except Exception as e:
         # Cleanup on error
         if temp_files:
@@ -73,131 +110,137 @@ def handle_text_conversion():
         logger.error(error_msg)
         return {"error": error_msg}, 500
 
-def convert_to_txt(filename, input_path, output_path):
+def stream_text(chunks, output_path, target_format, cache_key):
+    """Stream converted text in chunks and cache it once the stream completes."""
+    # Produce the first chunk now so unreadable input fails the request instead of the stream
+    first = next(chunks, '')
+
+    def generate():
+        try:
+            # Keep a copy of what was streamed so the next request can be served from the cache
+            with open(output_path, 'wb') as copy:
+                for chunk in itertools.chain([first], chunks):
+                    data = chunk.encode('utf-8')
+                    copy.write(data)
+                    yield data
+            conversion_cache.put_file(cache_key, output_path)
+        except Exception as e:
+            # Headers are already sent, so the client only sees a truncated body
+            logger.error(f"Error during streaming text conversion: {str(e)}")
+        finally:
+            chunks.close()
+
+    return Response(
+        generate(),
+        mimetype=f'application/{target_format}',
+        headers={'Content-Disposition': f'attachment; filename=converted_document.{target_format}'}
+    )
+
+def stream_file(output_path, target_format):
+    """Stream a converted file from disk in chunks instead of reading it into memory."""
+    def generate():
+        with open(output_path, 'rb') as f:
+            yield from iter(lambda: f.read(STREAM_CHUNK_SIZE), b'')
+
+    return Response(
+        generate(),
+        mimetype=f'application/{target_format}',
+        headers={
+            'Content-Disposition': f'attachment; filename=converted_document.{target_format}',
+            'Content-Length': str(os.path.getsize(output_path))
+        }
+    )
+
+def read_lines(input_path):
+    with open(input_path, 'r', encoding='utf-8') as f:
+        yield from f
+
+def read_chunks(input_path):
+    with open(input_path, 'r', encoding='utf-8') as f:
+        yield from iter(lambda: f.read(STREAM_CHUNK_SIZE), '')
+
+def buffered(chunks):
+    """Join small chunks into pieces of about STREAM_CHUNK_SIZE characters."""
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def pdf_to_txt(input_path, pages=None):
+    for text in iter_page_text(input_path, pages):
+        yield text + '\n'
+
+def pdf_to_md(input_path, pages=None):
+    for text in iter_page_text(input_path, pages):
+        # Convert PDF text to markdown paragraphs
+        for para in text.split('\n\n'):
+            yield para.strip() + '\n\n'
+
+def read_document(filename, input_path):
+    """Stream the blocks of a DOCX or ODT file."""
+    if filename.endswith('.odt'):
+        return read_odt(input_path)
+    return read_docx(input_path)
+
+def convert_to_txt(filename, input_path, pages=None):
+    """Return an iterator over the plain text chunks of the converted document."""
     if filename.endswith('.md'):
-        with open(input_path, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        # Convert markdown to plain text (strips all markdown formatting)
-        html_content = markdown.markdown(md_content)
-        # Simple HTML to text conversion (strips HTML tags)
-        text_content = html_content.replace('<p>', '').replace('</p>', '\n\n')
-        text_content = text_content.replace('<h1>', '').replace('</h1>', '\n\n')
-        text_content = text_content.replace('<h2>', '').replace('</h2>', '\n\n')
-        text_content = text_content.replace('<h3>', '').replace('</h3>', '\n\n')
-        text_content = text_content.replace('<ul>', '\n').replace('</ul>', '\n')
-        text_content = text_content.replace('<li>', '* ').replace('</li>', '\n')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text_content)
-    elif filename.endswith('.docx'):
-        doc = Document(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for para in doc.paragraphs:
-                f.write(para.text + '\n')
+        # Strip all markdown formatting, keeping list markers
+        return buffered(iter_txt(parse_markdown(read_lines(input_path))))
+    elif filename.endswith('.docx') or filename.endswith('.odt'):
+        # One line per paragraph, streamed straight from the document XML
+        blocks = read_document(filename, input_path)
+        return buffered(block.text + '\n' for block in blocks)
     elif filename.endswith('.pdf'):
-        reader = PdfReader(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for page in reader.pages:
-                f.write(page.extract_text() + '\n')
-    elif filename.endswith('.odt'):
-        doc = OpenDocumentText(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for element in doc.getElementsByType(odf_text.P):
-                f.write(element.text + '\n')
+        return pdf_to_txt(input_path, pages)
     else:
         # For txt files, just copy
-        with open(input_path, 'r', encoding='utf-8') as f_in:
-            with open(output_path, 'w', encoding='utf-8') as f_out:
-                f_out.write(f_in.read())
+        return read_chunks(input_path)
 
-def convert_to_docx(filename, input_path, output_path):
-    doc = Document()
-    if filename.endswith('.md'):
-        with open(input_path, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        # Convert markdown to HTML
-        html_content = markdown.markdown(md_content)
-        # Parse the HTML content and add to document with formatting
-        for line in html_content.split('\n'):
-            if line.startswith('<h1>'):
-                doc.add_heading(line[4:-5], level=1)
-            elif line.startswith('<h2>'):
-                doc.add_heading(line[4:-5], level=2)
-            elif line.startswith('<h3>'):
-                doc.add_heading(line[4:-5], level=3)
-            elif line.startswith('<p>'):
-                doc.add_paragraph(line[3:-4])
-            elif line.startswith('<li>'):
-                doc.add_paragraph(line[4:-5], style='List Bullet')
-    elif filename.endswith('.txt'):
-        with open(input_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                doc.add_paragraph(line.strip())
-    elif filename.endswith('.pdf'):
-        reader = PdfReader(input_path)
-        for page in reader.pages:
-            doc.add_paragraph(page.extract_text())
-    doc.save(output_path)
-
-def convert_to_pdf(filename, input_path, output_path, temp_dir, temp_files):
-    if filename.endswith('.md') or filename.endswith('.txt'):
-        # Convert to docx first
-        doc = Document()
+def convert_to_docx(filename, input_path, output_path, pages=None):
+    # Parsing and writing are interleaved, so they are timed as one stage
+    with metrics.stage('convert'):
         if filename.endswith('.md'):
             with open(input_path, 'r', encoding='utf-8') as f:
-                md_content = f.read()
-            # Convert markdown to HTML
-            html_content = markdown.markdown(md_content)
-            # Parse the HTML content and add to document with formatting
-            for line in html_content.split('\n'):
-                if line.startswith('<h1>'):
-                    doc.add_heading(line[4:-5], level=1)
-                elif line.startswith('<h2>'):
-                    doc.add_heading(line[4:-5], level=2)
-                elif line.startswith('<h3>'):
-                    doc.add_heading(line[4:-5], level=3)
-                elif line.startswith('<p>'):
-                    doc.add_paragraph(line[3:-4])
-                elif line.startswith('<li>'):
-                    doc.add_paragraph(line[4:-5], style='List Bullet')
-        else:  # txt file
+                write_docx(parse_markdown(f), output_path)
+        elif filename.endswith('.txt'):
             with open(input_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    doc.add_paragraph(line.strip())
-        
-        temp_docx_path = os.path.join(temp_dir, 'temp.docx')
-        doc.save(temp_docx_path)
-        temp_files.append(temp_docx_path)
-        # Convert DOCX to PDF
-        convert(temp_docx_path, output_path)
+                write_docx(parse_text(f), output_path)
+        elif filename.endswith('.pdf'):
+            write_docx((plain(PARAGRAPH, text) for text in iter_page_text(input_path, pages)), output_path)
+        elif filename.endswith('.docx') or filename.endswith('.odt'):
+            write_docx(read_document(filename, input_path), output_path)
+        else:
+            Document().save(output_path)
 
-def convert_to_md(filename, input_path, output_path):
+def convert_to_pdf(filename, input_path, output_path):
+    # Parsed and rendered straight to PDF on the text pool, no intermediate DOCX
+    with metrics.stage('convert'):
+        if filename.endswith('.md'):
+            with open(input_path, 'r', encoding='utf-8') as f:
+                write_pdf(parse_markdown(f), output_path)
+        elif filename.endswith('.txt'):
+            with open(input_path, 'r', encoding='utf-8') as f:
+                write_pdf(parse_text(f), output_path)
+        elif filename.endswith('.docx') or filename.endswith('.odt'):
+            write_pdf(read_document(filename, input_path), output_path)
+
+def convert_to_md(filename, input_path, pages=None):
+    """Return an iterator over the markdown chunks of the converted document."""
     if filename.endswith('.txt'):
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        # Convert plain text to markdown (each paragraph gets wrapped in markdown)
-        md_content = '\n\n'.join(f'{para}' for para in content.split('\n\n'))
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
-    elif filename.endswith('.docx'):
-        doc = Document(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for para in doc.paragraphs:
-                # Convert heading styles to markdown
-                if para.style.name.startswith('Heading'):
-                    level = int(para.style.name[-1])
-                    f.write('#' * level + ' ' + para.text + '\n\n')
-                # Convert list items
-                elif para.style.name == 'List Bullet':
-                    f.write('* ' + para.text + '\n')
-                # Regular paragraphs
-                else:
-                    f.write(para.text + '\n\n')
+        # Plain text paragraphs are already valid markdown
+        return read_chunks(input_path)
+    elif filename.endswith('.md'):
+        # Normalize the markdown through the document model
+        return buffered(iter_markdown(parse_markdown(read_lines(input_path))))
+    elif filename.endswith('.docx') or filename.endswith('.odt'):
+        # Heading and list styles become markdown headings and list items
+        return buffered(iter_markdown(read_document(filename, input_path)))
     elif filename.endswith('.pdf'):
-        reader = PdfReader(input_path)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for page in reader.pages:
-                # Convert PDF text to markdown paragraphs
-                text = page.extract_text()
-                paragraphs = text.split('\n\n')
-                for para in paragraphs:
-                    f.write(para.strip() + '\n\n')
\ No newline at end of file
+        return pdf_to_md(input_path, pages)
+    raise ValueError(f"Cannot convert {filename.rsplit('.', 1)[-1]} files to md")
@@ -1,23 +1,46 @@
-from flask import jsonify
+from flask import jsonify, request, Response
 from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import csv
+import io
+import itertools
+import json
+import shutil
+import tempfile
 import pytz
+from config import TIME_ZONE_BACKEND, logger
+
+# Rows converted between writes to a streamed batch response
+BATCH_FLUSH_ROWS = 1000
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """Return the tz object for a zone name, built once per process."""
+    if TIME_ZONE_BACKEND == 'zoneinfo':
+        return ZoneInfo(name)
+    return pytz.timezone(name)
+
+
+def convert_timestamp(value, source_tz, target_tz):
+    """Convert one ISO 8601 timestamp; naive values are read in source_tz."""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        if hasattr(source_tz, 'localize'):
+            dt = source_tz.localize(dt)
+        else:
+            dt = dt.replace(tzinfo=source_tz)
+    return dt.astimezone(target_tz).isoformat()
+
 
 def convert_time(value, from_timezone, to_timezone):
     try:
-        # Parse the input time
-        dt = datetime.fromisoformat(value)
-        
-        # Set the source timezone
-        source_tz = pytz.timezone(from_timezone)
-        dt = source_tz.localize(dt)
-        
-        # Convert to target timezone
-        target_tz = pytz.timezone(to_timezone)
-        converted_time = dt.astimezone(target_tz)
-        
+        converted_time = convert_timestamp(value, get_timezone(from_timezone), get_timezone(to_timezone))
+
         return jsonify({
             'success': True,
-            'result': converted_time.isoformat(),
+            'result': converted_time,
             'from_timezone': from_timezone,
             'to_timezone': to_timezone
         })
@@ -26,3 +49,164 @@ def convert_time(value, from_timezone, to_timezone):
             'success': False,
             'error': str(e)
         })
+
+
+def convert_time_batch():
+    """Convert many timestamps between one pair of time zones.
+
+    JSON bodies look like {"values": [...], "from_unit": ..., "to_unit": ...}.
+    CSV (text/csv) and JSON lines (application/x-ndjson) bodies take
+    from_unit, to_unit and column (CSV header name or index, default 0, or
+    JSON field, required) as query parameters and are streamed back in the
+    same format with that column converted. Values and JSON lines that
+    cannot be parsed are left unchanged. An unknown CSV column, or a JSON
+    field missing from the first record, is reported as a 400 before
+    streaming.
+    """
+    try:
+        if request.is_json:
+            data = request.get_json()
+            return _convert_json_batch(data['values'], data['from_unit'], data['to_unit'])
+
+        source_tz = get_timezone(request.args['from_unit'])
+        target_tz = get_timezone(request.args['to_unit'])
+        column = request.args.get('column')
+
+        # Spool the body first; reading the request while streaming the reply can deadlock
+        body = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        shutil.copyfileobj(request.stream, body)
+        body.seek(0)
+        text = io.TextIOWrapper(body, encoding='utf-8', newline='')
+
+        try:
+            if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json-lines'):
+                if not column:
+                    raise ValueError("column is required for JSON lines")
+                # Check the field now, while an error can still be sent as a 400
+                lines = _json_lines(text, column)
+                rows = _convert_json_lines(lines, column, source_tz, target_tz)
+            elif request.mimetype == 'text/csv':
+                # Resolve the column now, while an error can still be sent as a 400
+                reader = csv.reader(text)
+                index, header = _csv_column(reader, column or '0')
+                rows = _convert_csv(reader, index, header, source_tz, target_tz)
+            else:
+                text.close()
+                return jsonify({
+                    'success': False,
+                    'error': 'Send JSON, text/csv or application/x-ndjson'
+                }), 415
+        except Exception:
+            text.close()
+            raise
+
+        response = Response(rows, mimetype=request.mimetype)
+        # Closed even if the client goes away before the body is generated
+        response.call_on_close(text.close)
+        return response
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+def _convert_json_batch(values, from_timezone, to_timezone):
+    source_tz, target_tz = get_timezone(from_timezone), get_timezone(to_timezone)
+    results = []
+    errors = []
+    for index, value in enumerate(values):
+        try:
+            results.append(convert_timestamp(value, source_tz, target_tz))
+        except (ValueError, TypeError) as e:
+            results.append(None)
+            errors.append({'index': index, 'error': str(e)})
+
+    return jsonify({
+        'success': True,
+        'results': results,
+        'errors': errors,
+        'from_timezone': from_timezone,
+        'to_timezone': to_timezone
+    })
+
+
+def _csv_column(reader, column):
+    """Return the index of column, given as a number or a header name, and the header row if read.
+
+    Raises ValueError for a header name that is not in the header.
+    """
+    if column.isdigit():
+        return int(column), None
+    header = next(reader, None)
+    if header is None:
+        return 0, None
+    if column not in header:
+        raise ValueError(f"Column {column!r} is not in the CSV header")
+    return header.index(column), header
+
+
+def _convert_csv(reader, index, header, source_tz, target_tz):
+    """Yield the CSV with one column converted, a block of rows at a time."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header is not None:
+        writer.writerow(header)
+
+    failed = 0
+    for count, row in enumerate(reader, 1):
+        if index < len(row):
+            try:
+                row[index] = convert_timestamp(row[index], source_tz, target_tz)
+            except ValueError:
+                failed += 1
+        writer.writerow(row)
+        if count % BATCH_FLUSH_ROWS == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+    if failed:
+        logger.warning(f"Batch time conversion left {failed} unparseable values unchanged")
+
+
+def _json_lines(text, field):
+    """Return the non-blank lines of text, after checking the first record has field.
+
+    Raises ValueError when the first line is a JSON object without field.
+    Malformed lines are left for the conversion to pass through.
+    """
+    lines = (line for line in text if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return iter(())
+    try:
+        record = json.loads(first)
+    except ValueError:
+        record = None
+    if isinstance(record, dict) and field not in record:
+        raise ValueError(f"Field {field!r} is not in the JSON lines")
+    return itertools.chain([first], lines)
+
+
+def _convert_json_lines(lines, field, source_tz, target_tz):
+    """Yield JSON lines with one field converted, a block of lines at a time."""
+    out = []
+    failed = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+            record[field] = convert_timestamp(record[field], source_tz, target_tz)
+            line = json.dumps(record)
+        except (KeyError, ValueError, TypeError, IndexError):
+            # Malformed lines are passed through like unparseable values
+            failed += 1
+            line = line.rstrip('\r\n')
+        out.append(line)
+        if len(out) == BATCH_FLUSH_ROWS:
+            yield '\n'.join(out) + '\n'
+            out = []
+    if out:
+        yield '\n'.join(out) + '\n'
+    if failed:
+        logger.warning(f"Batch time conversion left {failed} unparseable values unchanged")
@@ -1,9 +1,318 @@
-from flask import request, send_file, abort
+from flask import request, send_file, abort, jsonify, url_for
+from werkzeug.exceptions import HTTPException
 from moviepy.video.io.VideoFileClip import VideoFileClip
+from proglog import ProgressBarLogger
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
 import tempfile
+import shutil
 import os
-from utils import validate_file, cleanup_temp_files
-from config import ALLOWED_VIDEO_EXTENSIONS, logger
+from utils import validate_file, cleanup_temp_files, create_temp_file
+from uploads import move_upload
+from config import (
+    ALLOWED_VIDEO_EXTENSIONS, VIDEO_ENGINE, VIDEO_MAX_THREADS, CPU_COUNT, VIDEO_SEGMENT_MIN_DURATION,
+    VIDEO_SEGMENT_MIN_LENGTH, VIDEO_SEGMENT_THREADS, logger
+)
+from cache import conversion_cache, file_digest
+from executors import get_pool, PoolBusy
+import jobs
+import media
+
+# Bitrate for each quality level
+VIDEO_BITRATES = {
+    'high': '8000k',
+    'medium': '4000k',
+    'low': '2000k'
+}
+
+# Encoder settings per speed/quality profile. These are constant-quality (CRF)
+# modes, so file size follows the content instead of a fixed bitrate.
+VIDEO_PROFILES = {
+    'fast': {
+        'libx264': ['-preset', 'veryfast', '-crf', '26'],
+        'libvpx-vp9': ['-deadline', 'realtime', '-cpu-used', '8', '-crf', '37', '-b:v', '0'],
+        'mpeg4': ['-q:v', '6']
+    },
+    'balanced': {
+        'libx264': ['-preset', 'medium', '-crf', '23'],
+        'libvpx-vp9': ['-deadline', 'good', '-cpu-used', '4', '-crf', '32', '-b:v', '0'],
+        'mpeg4': ['-q:v', '4']
+    },
+    'archival': {
+        'libx264': ['-preset', 'slow', '-crf', '18'],
+        'libvpx-vp9': ['-deadline', 'good', '-cpu-used', '1', '-crf', '24', '-b:v', '0'],
+        'mpeg4': ['-q:v', '2']
+    }
+}
+
+# Video and audio encoders used when a stream has to be re-encoded for a container
+CONTAINER_ENCODERS = {
+    'mp4': ('libx264', 'aac'),
+    'mov': ('libx264', 'aac'),
+    'mkv': ('libx264', 'libvorbis'),
+    'webm': ('libvpx-vp9', 'libvorbis'),
+    'avi': ('mpeg4', 'libmp3lame')
+}
+
+# Video and audio codecs each container can hold as-is (None means any codec)
+CONTAINER_CODECS = {
+    'mp4': ({'h264', 'hevc', 'mpeg4', 'av1'}, {'aac', 'mp3', 'alac', 'ac3', 'opus'}),
+    'mov': ({'h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'}, {'aac', 'mp3', 'alac', 'ac3', 'pcm_s16le'}),
+    'mkv': (None, None),
+    'webm': ({'vp8', 'vp9', 'av1'}, {'vorbis', 'opus'}),
+    'avi': ({'mpeg4', 'mjpeg'}, {'mp3', 'ac3', 'pcm_s16le'})
+}
+
+
+class MoviePyProgressLogger(ProgressBarLogger):
+    """MoviePy logger that reports frame progress as a percentage."""
+
+    def __init__(self, progress_callback):
+        super().__init__(min_time_interval=1.0)
+        self.progress_callback = progress_callback
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == 'frame_index' and attr == 'index':
+            total = self.bars[bar].get('total')
+            if total:
+                self.progress_callback(100.0 * value / total)
+
+
+def _fits_container(codec, allowed):
+    return allowed is None or codec in allowed
+
+
+def core_share(concurrent_encodes=1):
+    """Split the machine's cores between the encodes running at the same time."""
+    return max(1, CPU_COUNT // max(1, concurrent_encodes))
+
+
+def encoder_threads(concurrent_encodes=1):
+    """Threads for one ffmpeg encoder when concurrent_encodes run at once."""
+    return min(VIDEO_MAX_THREADS, core_share(concurrent_encodes))
+
+
+def _copies_video(info, target_format, quality, profile):
+    """Whether the source video stream can be remuxed into target_format as is.
+
+    A profile always re-encodes: it asks for a speed/quality trade-off, and
+    its constant-quality modes have no bitrate to compare the source with.
+    """
+    video = media.first_stream(info, 'video')
+    if profile or not video or not _fits_container(video['codec'], CONTAINER_CODECS[target_format][0]):
+        return False
+    # Only remux when the source is no bigger than the requested quality
+    source_bitrate = video['bitrate'] or info['bitrate']
+    return source_bitrate is None or source_bitrate <= int(VIDEO_BITRATES.get(quality, '4000k')[:-1])
+
+
+def _video_encoder_args(target_format, quality, profile, threads):
+    video_encoder = CONTAINER_ENCODERS[target_format][0]
+    args = ['-c:v', video_encoder, '-threads', str(threads)]
+    if profile:
+        args += VIDEO_PROFILES[profile][video_encoder]
+    else:
+        args += ['-b:v', VIDEO_BITRATES.get(quality, '4000k')]
+        if video_encoder == 'libx264':
+            args += ['-preset', 'medium']
+    if video_encoder == 'libx264':
+        args += ['-pix_fmt', 'yuv420p']
+    elif video_encoder == 'libvpx-vp9':
+        # Lets VP9 use more than a couple of threads at typical resolutions
+        args += ['-row-mt', '1']
+    return args
+
+
+def _audio_and_container_args(info, target_format):
+    args = []
+    audio = media.first_stream(info, 'audio')
+    if audio:
+        if _fits_container(audio['codec'], CONTAINER_CODECS[target_format][1]):
+            args += ['-c:a', 'copy']
+        else:
+            args += ['-c:a', CONTAINER_ENCODERS[target_format][1]]
+
+    if target_format in ('mp4', 'mov'):
+        args += ['-movflags', '+faststart']
+    return args
+
+
+def build_ffmpeg_args(info, input_path, output_path, target_format, quality, profile=None, threads=None):
+    """Build ffmpeg arguments, copying any stream that already fits the target container.
+
+    With a profile the video is always encoded, at that profile's constant
+    quality; otherwise it is copied when it fits and is within the bitrate
+    for quality, and encoded at that bitrate when not.
+    """
+    args = ['-i', input_path, '-map', '0:v:0?', '-map', '0:a:0?']
+
+    if media.first_stream(info, 'video'):
+        if _copies_video(info, target_format, quality, profile):
+            args += ['-c:v', 'copy']
+        else:
+            args += _video_encoder_args(target_format, quality, profile, threads or encoder_threads())
+
+    return args + _audio_and_container_args(info, target_format) + [output_path]
+
+
+def can_stream_copy(info, target_format):
+    """Whether every stream of the source can go into target_format without re-encoding."""
+    video_codecs, audio_codecs = CONTAINER_CODECS[target_format]
+    video, audio = media.first_stream(info, 'video'), media.first_stream(info, 'audio')
+    return ((not video or _fits_container(video['codec'], video_codecs))
+            and (not audio or _fits_container(audio['codec'], audio_codecs)))
+
+
+def build_trim_args(info, input_path, output_path, target_format, start, end=None, accurate=False, threads=None):
+    """Build ffmpeg arguments that cut start-end seconds out of a video.
+
+    The input is seeked to start before it is opened. When the streams fit
+    the target container and accurate is not set they are copied, and the
+    clip begins at the keyframe at or before start; otherwise the clip is
+    re-encoded from exactly start.
+    """
+    args = ['-ss', f'{start:.3f}', '-i', input_path]
+    if end is not None:
+        args += ['-t', f'{end - start:.3f}']
+    args += ['-map', '0:v:0?', '-map', '0:a:0?']
+
+    if not accurate and can_stream_copy(info, target_format):
+        args += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        if target_format in ('mp4', 'mov'):
+            args += ['-movflags', '+faststart']
+        return args + [output_path]
+
+    if media.first_stream(info, 'video'):
+        args += _video_encoder_args(target_format, 'high', None, threads or encoder_threads())
+    return args + _audio_and_container_args(info, target_format) + [output_path]
+
+
+def trim_video(info, input_path, output_path, target_format, start, end=None, accurate=False, threads=None):
+    """Write the start-end seconds of the video at input_path to output_path."""
+    args = build_trim_args(info, input_path, output_path, target_format, start, end, accurate, threads)
+    media.run_ffmpeg(args)
+
+
+def segment_count(info, target_format, quality, profile, cores):
+    """Number of pieces to encode a video in parallel, or 0 to encode it in one pass."""
+    duration = info['duration'] or 0
+    if duration < VIDEO_SEGMENT_MIN_DURATION or _copies_video(info, target_format, quality, profile):
+        return 0
+    count = min(cores // VIDEO_SEGMENT_THREADS, int(duration // VIDEO_SEGMENT_MIN_LENGTH))
+    return count if count >= 2 else 0
+
+
+def _transcode_segmented(info, input_path, output_path, target_format, quality, profile, cores, count,
+                         progress_callback=None):
+    """Encode the video stream in parallel pieces and join them without re-encoding.
+
+    The video is cut at keyframes with a stream copy, so every piece decodes
+    on its own. The pieces are encoded by concurrent ffmpeg processes, then
+    concatenated and muxed with the source audio, which is encoded in one
+    pass to avoid gaps at the joins.
+    """
+    with tempfile.TemporaryDirectory(prefix='segments_', dir=os.path.dirname(output_path)) as work_dir:
+        media.run_ffmpeg([
+            '-i', input_path, '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-segment_time', f'{info["duration"] / count:.3f}',
+            '-segment_format', 'matroska', '-reset_timestamps', '1',
+            os.path.join(work_dir, 'source%04d.mkv')
+        ])
+        sources = sorted(name for name in os.listdir(work_dir) if name.startswith('source'))
+        durations = [media.probe_media(os.path.join(work_dir, name))['duration'] or 0 for name in sources]
+        logger.info(f"Encoding {input_path} as {len(sources)} segments")
+
+        # Progress is each piece's percentage weighted by its share of the running time
+        total = sum(durations) or 1
+        done = [0.0] * len(sources)
+        lock = threading.Lock()
+
+        def report(index, percent):
+            with lock:
+                done[index] = percent * durations[index]
+                progress_callback(sum(done) / total)
+
+        threads = max(1, cores // count)
+        encoder_args = _video_encoder_args(target_format, quality, profile, threads)
+        outputs = [os.path.join(work_dir, f'encoded{index:04d}.mkv') for index in range(len(sources))]
+
+        def encode(index):
+            media.run_ffmpeg(
+                ['-i', os.path.join(work_dir, sources[index]), '-map', '0:v:0'] + encoder_args + [outputs[index]],
+                duration=durations[index],
+                progress_callback=partial(report, index) if progress_callback else None
+            )
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            # list() re-raises the first failed piece
+            list(executor.map(encode, range(len(sources))))
+
+        concat_list = os.path.join(work_dir, 'segments.txt')
+        with open(concat_list, 'w') as f:
+            f.writelines(f"file '{path}'\n" for path in outputs)
+
+        media.run_ffmpeg(
+            ['-f', 'concat', '-safe', '0', '-i', concat_list, '-i', input_path,
+             '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy']
+            + _audio_and_container_args(info, target_format) + [output_path]
+        )
+
+
+def transcode_video(input_path, output_path, target_format, quality='high', progress_callback=None,
+                    profile=None, cores=None):
+    """Encode the video at input_path into target_format at output_path.
+
+    cores is this conversion's share of the CPU. Videos longer than
+    VIDEO_SEGMENT_MIN_DURATION that need re-encoding are split across it in
+    parallel pieces; anything else is a single ffmpeg run.
+    """
+    cores = cores or core_share()
+    threads = min(VIDEO_MAX_THREADS, cores)
+    if VIDEO_ENGINE == 'moviepy':
+        return _transcode_with_moviepy(input_path, output_path, target_format, quality, progress_callback,
+                                       profile, threads)
+
+    info = media.probe_media(input_path)
+    count = segment_count(info, target_format, quality, profile, cores)
+    if count:
+        return _transcode_segmented(info, input_path, output_path, target_format, quality, profile, cores, count,
+                                    progress_callback)
+
+    args = build_ffmpeg_args(info, input_path, output_path, target_format, quality, profile, threads)
+    media.run_ffmpeg(args, duration=info['duration'], progress_callback=progress_callback)
+
+
+def _transcode_with_moviepy(input_path, output_path, target_format, quality, progress_callback,
+                            profile=None, threads=None):
+    # MoviePy only exposes the x264 preset, so a profile picks that and keeps the bitrate
+    preset = VIDEO_PROFILES[profile]['libx264'][1] if profile else 'medium'
+    video = VideoFileClip(input_path)
+    try:
+        video.write_videofile(
+            output_path,
+            codec='libx264' if target_format == 'mp4' else None,
+            bitrate=VIDEO_BITRATES.get(quality, '4000k'),
+            audio_codec='aac' if target_format in ['mp4', 'mov'] else 'libvorbis',
+            preset=preset,
+            threads=threads or encoder_threads(),
+            logger=MoviePyProgressLogger(progress_callback) if progress_callback else 'bar'
+        )
+    finally:
+        # Close the video to free up resources
+        video.close()
+
+
+def run_video_job(job_id, input_path, output_path, target_format, quality, cache_key, profile=None, cores=None):
+    """Background job entry point for a video conversion."""
+    try:
+        transcode_video(input_path, output_path, target_format, quality,
+                        progress_callback=partial(jobs.update_progress, job_id),
+                        profile=profile, cores=cores)
+        conversion_cache.put_file(cache_key, output_path)
+    finally:
+        cleanup_temp_files([input_path])
+
 
 def handle_video_conversion():
     temp_files = []  # Keep track of temporary files
@@ -17,44 +326,49 @@ def handle_video_conversion():
             abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}")
 
         quality = request.form.get('quality', 'high')  # high, medium, low
+        profile = request.form.get('profile') or None  # fast, balanced, archival
+        if profile and profile not in VIDEO_PROFILES:
+            abort(400, description=f"Invalid profile. Allowed profiles: {', '.join(VIDEO_PROFILES)}")
+        run_async = request.form.get('async', 'false').lower() in ('1', 'true', 'yes')
 
         logger.info(f"Starting video conversion: {filename} to {target_format}")
 
-        # Create temporary files with unique names
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{video_file.filename.split(".")[-1]}')
+        # Identifies earlier conversions of the same video with the same settings
+        cache_key = conversion_cache.make_key(
+            file_digest(video_file), kind='video', format=target_format,
+            quality=quality, profile=profile, engine=VIDEO_ENGINE
+        )
+
+        # Share the cores with every encode already running or queued
+        cores = core_share(get_pool('video').active + get_pool('jobs').active + 1)
+
+        if run_async:
+            return submit_video_job(video_file, filename, target_format, quality, cache_key, profile, cores)
+
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype=f'video/{target_format}',
+                as_attachment=True,
+                download_name=f'converted_video.{target_format}'
+            )
+
+        # Use the uploaded video where it already sits on disk
+        input_path = create_temp_file(video_file, suffix=f'.{filename.rsplit(".", 1)[-1]}')
         temp_output = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{target_format}')
-        temp_files.extend([temp_input.name, temp_output.name])
+        temp_files.extend([input_path, temp_output.name])
 
-        # Immediately close the file handles
-        temp_input.close()
+        # Immediately close the file handle
         temp_output.close()
 
-        # Save the uploaded video
-        video_file.save(temp_input.name)
-
         try:
-            # Load the video file
-            video = VideoFileClip(temp_input.name)
-
-            # Set bitrate based on quality
-            bitrate = {
-                'high': '8000k',
-                'medium': '4000k',
-                'low': '2000k'
-            }.get(quality, '4000k')
-
-            # Write the converted video
-            video.write_videofile(
-                temp_output.name,
-                codec='libx264' if target_format == 'mp4' else None,
-                bitrate=bitrate,
-                audio_codec='aac' if target_format in ['mp4', 'mov'] else 'libvorbis',
-                preset='medium',
-                threads=4
+            # Write the converted video on the video pool
+            get_pool('video').run(
+                transcode_video, input_path, temp_output.name, target_format, quality,
+                profile=profile, cores=cores
             )
-
-            # Close the video to free up resources
-            video.close()
+            conversion_cache.put_file(cache_key, temp_output.name)
 
             # Send the converted video file
             return send_file(
@@ -68,6 +382,41 @@ def handle_video_conversion():
             # Clean up temporary files
             cleanup_temp_files(temp_files)
 
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error converting video: {str(e)}")
-        return str(e), 500
\ No newline at end of file
+        logger.error(f"Error converting video: {str(e)}")
+        return str(e), 500
+
+
+def submit_video_job(video_file, filename, target_format, quality, cache_key, profile=None, cores=None):
+    """Queue a video conversion on the worker pool and return its job ID."""
+    job_id, job_dir = jobs.create_job_dir()
+    input_path = os.path.join(job_dir, f'input.{filename.rsplit(".", 1)[-1]}')
+    output_path = os.path.join(job_dir, f'output.{target_format}')
+    download_name = f'converted_video.{target_format}'
+    mimetype = f'video/{target_format}'
+
+    cached_path = conversion_cache.get(cache_key)
+    if cached_path:
+        # Link the cached result into the job directory so eviction cannot remove it
+        try:
+            os.link(cached_path, output_path)
+        except OSError:
+            shutil.copyfile(cached_path, output_path)
+        jobs.record_finished_job(job_id, output_path, download_name, mimetype)
+    else:
+        # Move the uploaded video straight into the job directory
+        move_upload(video_file, input_path)
+        jobs.submit_job(
+            job_id, run_video_job, output_path, download_name, mimetype,
+            input_path, output_path, target_format, quality, cache_key, profile, cores
+        )
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'download_url': url_for('job_download', job_id=job_id)
+    }), 202
@@ -0,0 +1,238 @@
+from flask import request, send_file, abort
+from werkzeug.exceptions import HTTPException
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import io
+import math
+import tempfile
+from utils import validate_file, cleanup_temp_files, create_temp_file
+from config import ALLOWED_VIDEO_EXTENSIONS, CPU_COUNT, logger
+from cache import conversion_cache, file_digest
+from executors import get_pool, PoolBusy
+from handlers.image_handlers import convert_image, encode_image, parse_image_options
+from handlers.video_handlers import encoder_threads, can_stream_copy, trim_video
+import media
+
+CONTACT_SHEET_MAX_FRAMES = 100
+CONTACT_SHEET_MAX_TILE_WIDTH = 1920
+
+
+def parse_time(value, field):
+    """Parse seconds given as a number or as [HH:]MM:SS[.fff]."""
+    try:
+        seconds = 0.0
+        for part in value.strip().split(':'):
+            seconds = seconds * 60 + float(part)
+        if seconds < 0 or math.isnan(seconds) or math.isinf(seconds):
+            raise ValueError
+        return seconds
+    except ValueError:
+        abort(400, description=f"{field} must be a time in seconds or HH:MM:SS")
+
+
+def _form_flag(name, default=False):
+    return request.form.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+def _form_int(name, default, maximum):
+    value = request.form.get(name)
+    if not value:
+        return default
+    try:
+        value = int(value)
+        if not (1 <= value <= maximum):
+            raise ValueError
+    except ValueError:
+        abort(400, description=f"{name} must be an integer from 1 to {maximum}")
+    return value
+
+
+def extract_frame(input_path, seconds, target_format, compression, keyframe=False, **resize):
+    """Return the frame at seconds encoded as target_format."""
+    return convert_image(media.grab_frame(input_path, seconds, keyframe=keyframe), target_format, compression, **resize)
+
+
+def make_contact_sheet(input_path, duration, count, columns, tile_width, target_format, compression):
+    """Tile count evenly spaced keyframes into a grid and return it encoded as target_format.
+
+    Each tile is grabbed by its own ffmpeg process that seeks straight to a
+    keyframe, so the cost depends on count rather than on the video's length.
+    """
+    times = [duration * (index + 0.5) / count for index in range(count)]
+    with ThreadPoolExecutor(max_workers=min(count, CPU_COUNT * 2)) as executor:
+        frames = list(executor.map(
+            lambda seconds: media.grab_frame(input_path, seconds, width=tile_width, keyframe=True), times
+        ))
+
+    tiles = [Image.open(io.BytesIO(frame)) for frame in frames]
+    tile_height = tiles[0].height
+    rows = math.ceil(count / columns)
+    sheet = Image.new('RGB', (columns * tile_width, rows * tile_height))
+    for index, tile in enumerate(tiles):
+        sheet.paste(tile, ((index % columns) * tile_width, (index // columns) * tile_height))
+    return encode_image(sheet, target_format, compression)
+
+
+def _probe_upload(video_file, filename, temp_files):
+    """Put the upload on disk and read its headers."""
+    input_path = create_temp_file(video_file, suffix=f'.{filename.rsplit(".", 1)[-1]}')
+    temp_files.append(input_path)
+    try:
+        info = media.probe_media(input_path)
+    except ValueError:
+        abort(400, description="Could not read the video file")
+    if not media.first_stream(info, 'video'):
+        abort(400, description="The file has no video stream")
+    return input_path, info
+
+
+def handle_video_frame():
+    temp_files = []
+    try:
+        video_file = request.files.get('file')
+        filename = validate_file(video_file, ALLOWED_VIDEO_EXTENSIONS)
+        target_format, compression, resize = parse_image_options()
+        seconds = parse_time(request.form.get('time', '0'), 'time')
+        # Snap to the keyframe at or before time instead of decoding up to it
+        keyframe = _form_flag('keyframe')
+
+        logger.info(f"Extracting frame at {seconds}s from {filename}")
+
+        cache_key = conversion_cache.make_key(
+            file_digest(video_file), kind='video-frame', time=seconds, keyframe=keyframe,
+            format=target_format, compression=compression, **resize
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(cached_path, mimetype=f'image/{target_format}',
+                             download_name=f'frame.{target_format}')
+
+        input_path, info = _probe_upload(video_file, filename, temp_files)
+        if info['duration'] is not None and seconds >= info['duration']:
+            abort(400, description=f"time is past the end of the video ({info['duration']:.3f}s)")
+
+        output = get_pool('image').run(
+            extract_frame, input_path, seconds, target_format, compression, keyframe, **resize
+        )
+        conversion_cache.put_bytes(cache_key, output)
+        return send_file(io.BytesIO(output), mimetype=f'image/{target_format}',
+                         download_name=f'frame.{target_format}')
+
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error extracting frame: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
+    finally:
+        cleanup_temp_files(temp_files)
+
+
+def handle_video_contact_sheet():
+    temp_files = []
+    try:
+        video_file = request.files.get('file')
+        filename = validate_file(video_file, ALLOWED_VIDEO_EXTENSIONS)
+        target_format, compression, _ = parse_image_options()
+        count = _form_int('count', 9, CONTACT_SHEET_MAX_FRAMES)
+        columns = _form_int('columns', math.ceil(math.sqrt(count)), count)
+        tile_width = _form_int('tile_width', 320, CONTACT_SHEET_MAX_TILE_WIDTH)
+
+        logger.info(f"Building {count} frame contact sheet from {filename}")
+
+        cache_key = conversion_cache.make_key(
+            file_digest(video_file), kind='video-contact-sheet', count=count, columns=columns,
+            tile_width=tile_width, format=target_format, compression=compression
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(cached_path, mimetype=f'image/{target_format}',
+                             download_name=f'contact_sheet.{target_format}')
+
+        input_path, info = _probe_upload(video_file, filename, temp_files)
+        if not info['duration']:
+            abort(400, description="Could not read the video's duration")
+
+        output = get_pool('image').run(
+            make_contact_sheet, input_path, info['duration'], count, columns, tile_width,
+            target_format, compression
+        )
+        conversion_cache.put_bytes(cache_key, output)
+        return send_file(io.BytesIO(output), mimetype=f'image/{target_format}',
+                         download_name=f'contact_sheet.{target_format}')
+
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error building contact sheet: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
+    finally:
+        cleanup_temp_files(temp_files)
+
+
+def handle_video_trim():
+    temp_files = []
+    try:
+        video_file = request.files.get('file')
+        filename = validate_file(video_file, ALLOWED_VIDEO_EXTENSIONS)
+
+        # Keep the source container unless asked for another one
+        target_format = request.form.get('targetFormat') or filename.rsplit('.', 1)[-1].lower()
+        if target_format not in ALLOWED_VIDEO_EXTENSIONS:
+            abort(400, description=f"Invalid target format. Allowed formats: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}")
+
+        start = parse_time(request.form.get('start', '0'), 'start')
+        end = request.form.get('end')
+        end = parse_time(end, 'end') if end else None
+        if end is not None and end <= start:
+            abort(400, description="end must be after start")
+        # Cut at exactly start by re-encoding rather than at the keyframe before it
+        accurate = _form_flag('accurate')
+
+        logger.info(f"Trimming {filename} from {start}s to {end if end is not None else 'the end'}")
+
+        cache_key = conversion_cache.make_key(
+            file_digest(video_file), kind='video-trim', format=target_format,
+            start=start, end=end, accurate=accurate
+        )
+        cached_path = conversion_cache.get(cache_key)
+        if cached_path:
+            return send_file(cached_path, mimetype=f'video/{target_format}', as_attachment=True,
+                             download_name=f'trimmed_video.{target_format}')
+
+        input_path, info = _probe_upload(video_file, filename, temp_files)
+        if info['duration'] is not None and start >= info['duration']:
+            abort(400, description=f"start is past the end of the video ({info['duration']:.3f}s)")
+
+        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{target_format}')
+        temp_output.close()
+        temp_files.append(temp_output.name)
+
+        if not accurate and can_stream_copy(info, target_format):
+            # A stream copy only moves packets, so it does not need a pool slot
+            trim_video(info, input_path, temp_output.name, target_format, start, end)
+        else:
+            threads = encoder_threads(get_pool('video').active + get_pool('jobs').active + 1)
+            get_pool('video').run(
+                trim_video, info, input_path, temp_output.name, target_format, start, end, True, threads
+            )
+        conversion_cache.put_file(cache_key, temp_output.name)
+
+        return send_file(temp_output.name, mimetype=f'video/{target_format}', as_attachment=True,
+                         download_name=f'trimmed_video.{target_format}')
+
+    except PoolBusy:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_msg = f"Error trimming video: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}, 500
+    finally:
+        cleanup_temp_files(temp_files)
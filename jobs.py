@@ -0,0 +1,214 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from config import (
+    JOB_BACKEND, JOB_STORE_PATH, JOB_OUTPUT_DIR, JOB_RESULT_TTL, JOB_STORE_TIMEOUT,
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_TIMEOUT, logger
+)
+from executors import get_pool, PoolBusy
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class SQLiteJobStore:
+    """Job store backed by a local SQLite file, shared by the web and worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        # A fresh connection per call keeps the store safe to use after fork
+        return sqlite3.connect(self.path, timeout=JOB_STORE_TIMEOUT)
+
+    def create(self, job_id, **fields):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (job_id, data, updated) VALUES (?, ?, ?)',
+                (job_id, json.dumps(fields), time.time())
+            )
+
+    def update(self, job_id, **fields):
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            data.update(fields)
+            conn.execute(
+                'UPDATE jobs SET data = ?, updated = ? WHERE job_id = ?',
+                (json.dumps(data), time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+
+class RedisJobStore:
+    """Job store backed by Redis; entries expire on their own after JOB_RESULT_TTL."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, job_id):
+        return f'converter:job:{job_id}'
+
+    def create(self, job_id, **fields):
+        self.client.set(self._key(job_id), json.dumps(fields), ex=JOB_RESULT_TTL)
+
+    def update(self, job_id, **fields):
+        raw = self.client.get(self._key(job_id))
+        if raw is None:
+            return
+        data = json.loads(raw)
+        data.update(fields)
+        self.client.set(self._key(job_id), json.dumps(data), ex=JOB_RESULT_TTL)
+
+    def get(self, job_id):
+        raw = self.client.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def delete(self, job_id):
+        self.client.delete(self._key(job_id))
+
+
+_store = None
+_store_pid = None
+
+
+def get_job_store():
+    """Return the job store for this process, creating it on first use."""
+    global _store, _store_pid
+    if _store is not None and _store_pid == os.getpid():
+        return _store
+
+    store = None
+    if JOB_BACKEND == 'redis':
+        try:
+            from redis import Redis
+
+            client = Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                socket_timeout=REDIS_TIMEOUT,
+                socket_connect_timeout=REDIS_TIMEOUT
+            )
+            client.ping()
+            store = RedisJobStore(client)
+        except ImportError:
+            logger.warning("Redis package not installed. Using SQLite job store")
+        except Exception as e:
+            logger.warning(f"Redis connection failed: {str(e)}. Falling back to SQLite job store.")
+
+    if store is None:
+        os.makedirs(os.path.dirname(JOB_STORE_PATH), exist_ok=True)
+        store = SQLiteJobStore(JOB_STORE_PATH)
+
+    _store, _store_pid = store, os.getpid()
+    return _store
+
+
+def create_job_dir():
+    """Create a working directory for a new job and return (job_id, job_dir)."""
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(JOB_OUTPUT_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    return job_id, job_dir
+
+
+def submit_job(job_id, func, output_path, download_name, mimetype, *args):
+    """Record a queued job and hand func(job_id, *args) to the jobs pool.
+
+    Raises PoolBusy, after removing the job and its directory, when the
+    pool's queue is full.
+    """
+    purge_expired_jobs()
+    get_job_store().create(
+        job_id,
+        status=JOB_QUEUED,
+        progress=0,
+        error=None,
+        output_path=output_path,
+        download_name=download_name,
+        mimetype=mimetype,
+        created=time.time()
+    )
+    try:
+        get_pool('jobs').submit(_run_job, job_id, func, *args)
+    except PoolBusy:
+        get_job_store().delete(job_id)
+        shutil.rmtree(os.path.join(JOB_OUTPUT_DIR, job_id), ignore_errors=True)
+        raise
+    logger.info(f"Queued job {job_id}")
+    return job_id
+
+
+def record_finished_job(job_id, output_path, download_name, mimetype):
+    """Record a job whose result is already available, e.g. from the cache."""
+    get_job_store().create(
+        job_id,
+        status=JOB_DONE,
+        progress=100,
+        error=None,
+        output_path=output_path,
+        download_name=download_name,
+        mimetype=mimetype,
+        created=time.time()
+    )
+    return job_id
+
+
+def _run_job(job_id, func, *args):
+    """Worker-side wrapper that tracks job state around func."""
+    store = get_job_store()
+    store.update(job_id, status=JOB_RUNNING, started=time.time())
+    try:
+        func(job_id, *args)
+        store.update(job_id, status=JOB_DONE, progress=100, finished=time.time())
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        store.update(job_id, status=JOB_FAILED, error=str(e), finished=time.time())
+
+
+def update_progress(job_id, progress):
+    """Report progress (0-100) for a running job."""
+    get_job_store().update(job_id, progress=round(progress, 1))
+
+
+def get_job(job_id):
+    """Return the stored state for a job, or None if it is unknown."""
+    return get_job_store().get(job_id)
+
+
+def purge_expired_jobs():
+    """Remove stored state and files of jobs older than JOB_RESULT_TTL."""
+    if not os.path.isdir(JOB_OUTPUT_DIR):
+        return
+    store = get_job_store()
+    cutoff = time.time() - JOB_RESULT_TTL
+    try:
+        for job_id in os.listdir(JOB_OUTPUT_DIR):
+            job_dir = os.path.join(JOB_OUTPUT_DIR, job_id)
+            if os.path.getmtime(job_dir) < cutoff:
+                store.delete(job_id)
+                shutil.rmtree(job_dir, ignore_errors=True)
+    except Exception as e:
+        logger.warning(f"Failed to purge expired jobs: {str(e)}")
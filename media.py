@@ -0,0 +1,182 @@
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from imageio_ffmpeg import get_ffmpeg_exe
+from config import logger
+import metrics
+
+# Use an explicitly configured ffmpeg, otherwise the binary bundled with imageio-ffmpeg
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY') or get_ffmpeg_exe()
+
+_INPUT_RE = re.compile(r"Input #0, (.+?), from ")
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_BITRATE_RE = re.compile(r"(\d+) kb/s")
+_STREAM_RE = re.compile(r"Stream #0:(\d+)[^:]*: (Video|Audio|Subtitle|Data): (\w+)(.*)")
+_SIZE_RE = re.compile(r", (\d{2,5})x(\d{2,5})")
+_FPS_RE = re.compile(r"([\d.]+) fps")
+_SAMPLE_RATE_RE = re.compile(r"(\d+) Hz")
+_CHANNELS_RE = re.compile(r"Hz, ([\w.()]+)")
+
+
+def probe_media(path):
+    """Read container and stream information from a media file's headers."""
+    with metrics.stage('probe'):
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-i', path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+    output = result.stderr.decode('utf-8', errors='replace')
+
+    info = {'format': None, 'duration': None, 'bitrate': None, 'streams': []}
+    match = _INPUT_RE.search(output)
+    if match:
+        info['format'] = match.group(1)
+
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('Duration:'):
+            match = _DURATION_RE.search(line)
+            if match:
+                hours, minutes, seconds = match.groups()
+                info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            match = _BITRATE_RE.search(line)
+            if match:
+                info['bitrate'] = int(match.group(1))
+            continue
+
+        match = _STREAM_RE.match(line)
+        if not match:
+            continue
+        index, stream_type, codec, details = match.groups()
+        stream = {'index': int(index), 'type': stream_type.lower(), 'codec': codec}
+        bitrate = _BITRATE_RE.search(details)
+        stream['bitrate'] = int(bitrate.group(1)) if bitrate else None
+        if stream['type'] == 'video':
+            size = _SIZE_RE.search(details)
+            fps = _FPS_RE.search(details)
+            stream['width'] = int(size.group(1)) if size else None
+            stream['height'] = int(size.group(2)) if size else None
+            stream['fps'] = float(fps.group(1)) if fps else None
+        elif stream['type'] == 'audio':
+            sample_rate = _SAMPLE_RATE_RE.search(details)
+            channels = _CHANNELS_RE.search(details)
+            stream['sample_rate'] = int(sample_rate.group(1)) if sample_rate else None
+            stream['channels'] = channels.group(1) if channels else None
+        info['streams'].append(stream)
+
+    if info['format'] is None:
+        raise ValueError("Could not read media file")
+    return info
+
+
+def first_stream(info, stream_type):
+    """Return the first stream of the given type from probe_media output, or None."""
+    for stream in info['streams']:
+        if stream['type'] == stream_type:
+            return stream
+    return None
+
+
+def grab_frame(path, seconds, width=None, keyframe=False):
+    """Decode the frame shown at seconds and return it as BMP bytes.
+
+    The input is seeked before it is opened, so only the group of pictures
+    holding the frame is decoded. With keyframe=True the nearest keyframe at
+    or before seconds is returned instead, and nothing else is decoded.
+    """
+    command = [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-loglevel', 'error']
+    if keyframe:
+        command += ['-skip_frame', 'nokey', '-noaccurate_seek']
+    command += ['-ss', f'{seconds:.3f}', '-i', path, '-map', '0:v:0', '-frames:v', '1']
+    if width:
+        command += ['-vf', f'scale={width}:-2']
+    command += ['-c:v', 'bmp', '-f', 'image2pipe', 'pipe:1']
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        message = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"ffmpeg failed: {message.splitlines()[-1] if message else 'no frame at that time'}")
+    return result.stdout
+
+
+def run_ffmpeg(args, duration=None, progress_callback=None):
+    """Run ffmpeg with args, reporting percent complete to progress_callback."""
+    command = [
+        FFMPEG_BINARY, '-hide_banner', '-nostdin', '-y',
+        '-loglevel', 'error', '-nostats', '-progress', 'pipe:1'
+    ] + list(args)
+    logger.info(f"Running ffmpeg: {' '.join(command[1:])}")
+
+    # Errors go to a file so a chatty stderr can never block the progress pipe
+    with metrics.stage('ffmpeg'), tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        for line in process.stdout:
+            if progress_callback and duration and line.startswith(b'out_time_us='):
+                try:
+                    out_time = int(line.split(b'=', 1)[1]) / 1000000
+                except ValueError:
+                    continue
+                progress_callback(min(100.0, 100.0 * out_time / duration))
+        process.wait()
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode('utf-8', errors='replace').strip()
+            raise RuntimeError(f"ffmpeg failed: {message.splitlines()[-1] if message else process.returncode}")
+
+
+def stream_ffmpeg(args, source, chunk_size=64 * 1024):
+    """Run ffmpeg and yield its encoded output in chunks.
+
+    args must write to 'pipe:1'. With a file-like source they must read from
+    'pipe:0'; with source None they name their own input, which lets ffmpeg
+    seek in it. Only one chunk of input and one chunk of output are held in
+    memory at a time.
+    """
+    command = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error'] + list(args)
+    logger.info(f"Streaming ffmpeg: {' '.join(command[1:])}")
+
+    with tempfile.TemporaryFile() as stderr:
+        stdin = subprocess.PIPE if source is not None else subprocess.DEVNULL
+        process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr)
+
+        def feed():
+            try:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+            except (BrokenPipeError, ValueError):
+                # ffmpeg exited early; the error is reported from its stderr
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        if source is not None:
+            feeder.start()
+        try:
+            while True:
+                chunk = process.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            process.wait()
+            if process.returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', errors='replace').strip()
+                raise RuntimeError(f"ffmpeg failed: {message.splitlines()[-1] if message else process.returncode}")
+        finally:
+            # Stop ffmpeg if the client went away before the stream finished
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if source is not None:
+                feeder.join()
+            process.stdout.close()
@@ -0,0 +1,260 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from flask import g, request, has_request_context
+from werkzeug.wsgi import ClosingIterator, FileWrapper
+from config import METRICS_ENABLED
+
+# Upper bounds (seconds) of the latency histogram buckets; video encodes run for minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts, sum, count]; the +Inf bucket is the count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", bound)])} {bucket_count}'
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {count}'
+
+
+REQUEST_LATENCY = Histogram(
+    'converter_request_duration_seconds', 'Time from request start to response start',
+    ('route', 'method', 'status')
+)
+REQUEST_BYTES = Counter('converter_request_bytes_total', 'Request body bytes received', ('route',))
+RESPONSE_BYTES = Counter('converter_response_bytes_total', 'Response body bytes sent', ('route',))
+STAGE_LATENCY = Histogram('converter_stage_duration_seconds', 'Time spent in each stage of a request',
+                          ('route', 'stage'))
+POOL_WAIT = Histogram('converter_pool_wait_seconds', 'Time tasks waited for a converter process', ('pool',))
+CACHE_LOOKUPS = Counter('converter_cache_lookups_total', 'Conversion cache lookups', ('route', 'result'))
+
+_metrics = [REQUEST_LATENCY, REQUEST_BYTES, RESPONSE_BYTES, STAGE_LATENCY, POOL_WAIT, CACHE_LOOKUPS]
+# Stages timed by the pool task running in this worker process, sent back to
+# the web process with its result. Workers run one task at a time, so stages
+# timed on threads the task starts are included.
+_worker_stages = None
+# Callables returning (name, documentation, [(labels dict, value)]) gauges, read at scrape time
+_gauge_collectors = []
+
+
+def register_gauges(collector):
+    """Add a callable that reports gauges each time metrics are rendered."""
+    _gauge_collectors.append(collector)
+
+
+def current_route():
+    """Return the matched route template, which keeps label cardinality bounded."""
+    if not has_request_context():
+        return 'background'
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def record_stage(stage, seconds):
+    """Record that stage took seconds, on the current request's Server-Timing list as well."""
+    if not METRICS_ENABLED:
+        return
+    if _worker_stages is not None:
+        _worker_stages.append((stage, seconds))
+        return
+    STAGE_LATENCY.observe(seconds, route=current_route(), stage=stage)
+    if has_request_context():
+        g.setdefault('_stage_timings', []).append((stage, seconds))
+
+
+@contextmanager
+def collect_stages():
+    """Collect the stages recorded in this process into a list instead of observing them.
+
+    Pool workers run outside any request and their metrics are never
+    scraped, so they return what they timed to the web process.
+    """
+    global _worker_stages
+    _worker_stages = stages = []
+    try:
+        yield stages
+    finally:
+        _worker_stages = None
+
+
+def record_worker_stages(stages, route):
+    """Observe the stages a pool task timed for a task submitted from route."""
+    if METRICS_ENABLED:
+        for stage, seconds in stages:
+            STAGE_LATENCY.observe(seconds, route=route, stage=stage)
+
+
+def add_server_timing(stages):
+    """Add stages observed elsewhere, e.g. by a pool worker, to this request's Server-Timing."""
+    if METRICS_ENABLED and has_request_context():
+        g.setdefault('_stage_timings', []).extend(stages)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage of the request."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_cache_lookup(hit):
+    if METRICS_ENABLED:
+        CACHE_LOOKUPS.inc(route=current_route(), result='hit' if hit else 'miss')
+
+
+def record_pool_wait(pool, seconds):
+    if METRICS_ENABLED:
+        POOL_WAIT.observe(seconds, pool=pool)
+
+
+class CountingBody:
+    """Wraps a streamed response body and counts the bytes sent."""
+
+    def __init__(self, body, route):
+        self.body = body
+        self.route = route
+
+    def __iter__(self):
+        for chunk in self.body:
+            RESPONSE_BYTES.inc(len(chunk), route=self.route)
+            yield chunk
+
+    def close(self):
+        # Let the wrapped generator run its cleanup when the client goes away
+        close = getattr(self.body, 'close', None)
+        if close:
+            close()
+
+
+def server_timing():
+    """Build a Server-Timing header value from the stages recorded for this request."""
+    totals = {}
+    for name, seconds in g.get('_stage_timings', []):
+        totals[name] = totals.get(name, 0) + seconds
+    return ', '.join(f'{name.replace(":", "-")};dur={seconds * 1000:.1f}' for name, seconds in totals.items())
+
+
+def _record_send(route, started):
+    STAGE_LATENCY.observe(time.perf_counter() - started, route=route, stage='send')
+
+
+def call_on_close(response, func):
+    """Call func once the server closes response, after its body has been sent.
+
+    Returns False when that cannot be detected: files handed to a server's
+    own wsgi.file_wrapper are left alone so it can still use sendfile.
+    """
+    if not response.direct_passthrough:
+        response.call_on_close(func)
+    elif isinstance(response.response, (FileWrapper, ClosingIterator)):
+        # Passed through without the response's close hooks, so close is hooked here
+        response.response = ClosingIterator(response.response, func)
+    else:
+        return False
+    return True
+
+
+def observe_request(response, started):
+    """Record latency and bytes for a finished request, returning the response to send.
+
+    Latency ends when the response starts. The time to send the body,
+    including generating streamed bodies, is recorded as the send stage when
+    the server closes the response, where call_on_close can detect it.
+    """
+    route = current_route()
+    now = time.perf_counter()
+    REQUEST_LATENCY.observe(now - started, route=route, method=request.method, status=response.status_code)
+    call_on_close(response, partial(_record_send, route, now))
+    REQUEST_BYTES.inc(request.content_length or 0, route=route)
+    if response.content_length is not None:
+        RESPONSE_BYTES.inc(response.content_length, route=route)
+    elif response.is_streamed and not response.direct_passthrough:
+        response.response = CountingBody(response.response, route)
+    return response
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    for collector in _gauge_collectors:
+        for name, documentation, values in collector():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in values:
+                lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {value}')
+    return '\n'.join(lines) + '\n'
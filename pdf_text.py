@@ -0,0 +1,79 @@
+from collections import deque
+from PyPDF2 import PdfReader
+from config import PDF_CHUNK_PAGES
+from executors import get_pool
+
+
+def parse_page_range(spec, page_count):
+    """Turn a 1-based range like "1-5,8,12-" into a sorted list of 0-based page indices."""
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        try:
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else page_count) if sep else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part}")
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: {part}")
+        pages.update(range(first - 1, min(last, page_count)))
+
+    if not pages:
+        raise ValueError(f"Page range {spec} is outside the document ({page_count} pages)")
+    return sorted(pages)
+
+
+def page_count(path):
+    """Return the number of pages in a PDF."""
+    return len(PdfReader(path).pages)
+
+
+def extract_pages(path, pages):
+    """Extract the text of the given 0-based pages, in order."""
+    reader = PdfReader(path)
+    return [reader.pages[index].extract_text() or '' for index in pages]
+
+
+def iter_page_text(path, pages=None):
+    """Yield the text of each selected page in order, extracting chunks in parallel.
+
+    Pages are split into chunks of PDF_CHUNK_PAGES handed to the pdf pool.
+    Chunks are yielded as soon as they and every chunk before them are done,
+    with at most two chunks per worker in flight. Short documents are
+    extracted in-process since the pool round-trip would cost more than it saves.
+    """
+    if isinstance(pages, str) or pages is None:
+        pages = parse_page_range(pages, page_count(path))
+
+    chunks = [pages[i:i + PDF_CHUNK_PAGES] for i in range(0, len(pages), PDF_CHUNK_PAGES)]
+    pool = get_pool('pdf')
+    if len(chunks) <= 1 or pool.workers <= 1:
+        for chunk in chunks:
+            yield from extract_pages(path, chunk)
+        return
+
+    # Refuse new work up front; once text is flowing, wait for free slots instead
+    pool.check()
+    pending = deque()
+    remaining = iter(chunks)
+    try:
+        for chunk in remaining:
+            pending.append(pool.submit(extract_pages, path, chunk, block=True))
+            if len(pending) >= pool.workers * 2:
+                break
+        while pending:
+            texts = pending.popleft().result()
+            # Refill the window before handing text back so workers stay busy
+            chunk = next(remaining, None)
+            if chunk is not None:
+                pending.append(pool.submit(extract_pages, path, chunk, block=True))
+            yield from texts
+    finally:
+        for future in pending:
+            future.cancel()
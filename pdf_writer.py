@@ -0,0 +1,175 @@
+import zlib
+
+# Glyph widths (1/1000 em) of the standard Type1 fonts for characters 32-126
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+# Width used for characters outside the table, e.g. accented letters
+_DEFAULT_WIDTH = 556
+
+FONTS = {
+    'F1': ('Helvetica', _HELVETICA_WIDTHS),
+    'F2': ('Helvetica-Bold', _HELVETICA_BOLD_WIDTHS),
+    'F3': ('Courier', [600] * 95),
+}
+
+# Block style -> (font, size, indent, space before, space after)
+STYLES = {
+    'h1': ('F2', 20, 0, 14, 8),
+    'h2': ('F2', 16, 0, 12, 6),
+    'h3': ('F2', 13, 0, 10, 4),
+    'p': ('F1', 11, 0, 0, 6),
+    'li': ('F1', 11, 18, 0, 3),
+    'ol': ('F1', 11, 18, 0, 3),
+    'quote': ('F1', 11, 24, 0, 6),
+    'pre': ('F3', 9, 12, 0, 0),
+}
+
+PAGE_WIDTH = 612  # US Letter, matching the python-docx default template
+PAGE_HEIGHT = 792
+MARGIN = 72
+LINE_SPACING = 1.2
+BULLET = '•'
+
+
+def _text_width(text, font, size):
+    widths = FONTS[font][1]
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if 32 <= code <= 126 else _DEFAULT_WIDTH
+    return total * size / 1000
+
+
+def _wrap(text, font, size, max_width):
+    """Break text into lines no wider than max_width, splitting on spaces."""
+    lines = []
+    space = _text_width(' ', font, size)
+    line, line_width = [], 0
+    for word in text.split():
+        width = _text_width(word, font, size)
+        if line and line_width + space + width > max_width:
+            lines.append(' '.join(line))
+            line, line_width = [], 0
+        line_width += width + (space if line else 0)
+        line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    return lines
+
+
+def _encode(text):
+    """Encode text as a PDF string literal in WinAnsiEncoding."""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class _PdfFile:
+    """Writes numbered objects straight to disk and builds the xref table as it goes."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.next_id = 1
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def write(self, obj_id, body):
+        self.offsets[obj_id] = self.f.tell()
+        self.f.write(b'%d 0 obj\n' % obj_id + body + b'\nendobj\n')
+
+    def write_stream(self, obj_id, data):
+        data = zlib.compress(data)
+        self.write(obj_id, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(data) + data + b'\nendstream')
+
+    def finish(self, root_id):
+        xref = self.f.tell()
+        self.f.write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_id)
+        for obj_id in range(1, self.next_id):
+            self.f.write(b'%010d 00000 n \n' % self.offsets[obj_id])
+        self.f.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, root_id, xref))
+
+
+def write_pdf(blocks, output_path):
+    """Render (style, text) blocks to a PDF using the standard Type1 fonts.
+
+    Styles are the keys of STYLES: h1-h3 headings, p paragraphs, li bullet
+    items, ol numbered items (the number is part of the text), quote, and pre
+    for preformatted lines, which keep their spacing. Text is wrapped to the
+    page width and pages are flushed to disk as soon as they fill up, so
+    memory use does not grow with document length.
+    """
+    with open(output_path, 'wb') as f:
+        pdf = _PdfFile(f)
+        catalog_id, pages_id = pdf.reserve(), pdf.reserve()
+        font_ids = {}
+        for name, (base_font, _) in FONTS.items():
+            font_ids[name] = pdf.reserve()
+            pdf.write(font_ids[name], b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>'
+                      % base_font.encode('ascii'))
+        resources = b'<< /Font << %s >> >>' % b' '.join(
+            b'/%s %d 0 R' % (name.encode('ascii'), obj_id) for name, obj_id in font_ids.items()
+        )
+
+        page_ids = []
+        content = []
+        y = PAGE_HEIGHT - MARGIN
+
+        def flush_page():
+            content_id, page_id = pdf.reserve(), pdf.reserve()
+            pdf.write_stream(content_id, b'\n'.join(content))
+            pdf.write(page_id, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>'
+                      % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, resources, content_id))
+            page_ids.append(page_id)
+            content.clear()
+
+        for style, text in blocks:
+            font, size, indent, space_before, space_after = STYLES[style]
+            leading = size * LINE_SPACING
+            left = MARGIN + indent
+            if style == 'pre':
+                # Monospaced, so break at a fixed column rather than between words
+                columns = int((PAGE_WIDTH - MARGIN - left) * 1000 / (600 * size))
+                lines = [text[i:i + columns] for i in range(0, len(text), columns)] or ['']
+            else:
+                lines = _wrap(text, font, size, PAGE_WIDTH - MARGIN - left) or ['']
+
+            if content:
+                y -= space_before
+            for number, line in enumerate(lines):
+                if y - leading < MARGIN:
+                    flush_page()
+                    y = PAGE_HEIGHT - MARGIN
+                y -= leading
+                if style == 'li' and number == 0:
+                    content.append(b'BT /%s %d Tf %.2f %.2f Td %s Tj ET'
+                                   % (font.encode('ascii'), size, left - 12, y, _encode(BULLET)))
+                if line:
+                    content.append(b'BT /%s %d Tf %.2f %.2f Td %s Tj ET'
+                                   % (font.encode('ascii'), size, left, y, _encode(line)))
+            y -= space_after
+
+        if content or not page_ids:
+            flush_page()
+
+        pdf.write(pages_id, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                  % (b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids)))
+        pdf.write(catalog_id, b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id)
+        pdf.finish(catalog_id)
@@ -0,0 +1,167 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from config import PROFILE_INTERVAL, PROFILE_KEEP, PROFILE_SLOW_SECONDS, logger
+
+# Profile collecting samples for the request running on this thread, if any
+_local = threading.local()
+_ids = itertools.count(1)
+
+
+def _frame_name(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class Sampler:
+    """Statistical profiler that periodically records one thread's call stack.
+
+    A background thread reads the target thread's current frame every
+    interval seconds and counts each distinct stack, root first. Nothing is
+    hooked into the profiled code, so its overhead does not depend on how many
+    calls it makes.
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the stack counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def profile_call(func, args, kwargs):
+    """Run func under a sampler and return (result, stack counts); used inside pool workers."""
+    sampler = Sampler().start()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        stacks = sampler.stop()
+    return result, stacks
+
+
+class Profile:
+    """Samples gathered for one request, from its own thread and from pool workers."""
+
+    def __init__(self, route, method):
+        self.id = next(_ids)
+        self.route = route
+        self.method = method
+        self.started = time.time()
+        self.duration = None
+        self._sampler = Sampler().start()
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+
+    def add_stacks(self, stacks, prefix):
+        """Merge stacks sampled elsewhere, e.g. in a pool worker, under a prefix frame."""
+        with self._lock:
+            for stack, count in stacks.items():
+                self._stacks[f'{prefix};{stack}'] += count
+
+    def finish(self):
+        self.duration = time.time() - self.started
+        stacks = self._sampler.stop()
+        with self._lock:
+            self._stacks.update(stacks)
+
+    def collapsed(self):
+        """Return the samples in collapsed-stack format, readable by flamegraph.pl and speedscope."""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
+
+    def summary(self):
+        with self._lock:
+            samples = sum(self._stacks.values())
+        return {
+            'id': self.id,
+            'route': self.route,
+            'method': self.method,
+            'started': self.started,
+            'duration': self.duration,
+            'samples': samples
+        }
+
+
+class ProfileStore:
+    """Keeps the last PROFILE_KEEP finished profiles for each route."""
+
+    def __init__(self, keep=PROFILE_KEEP):
+        self.keep = keep
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles.setdefault(profile.route, deque(maxlen=self.keep)).append(profile)
+
+    def get(self, profile_id):
+        with self._lock:
+            for profiles in self._profiles.values():
+                for profile in profiles:
+                    if profile.id == profile_id:
+                        return profile
+        return None
+
+    def summaries(self):
+        with self._lock:
+            profiles = [profile for route in self._profiles.values() for profile in route]
+        return [profile.summary() for profile in sorted(profiles, key=lambda p: p.started, reverse=True)]
+
+
+profile_store = ProfileStore()
+
+
+def start(route, method):
+    """Start profiling the request on this thread."""
+    if current() is not None:
+        # Left over from a response the server never closed; stop its sampler
+        finish(PROFILE_SLOW_SECONDS)
+    _local.profile = Profile(route, method)
+    return _local.profile
+
+
+def current():
+    """Return the profile of the request on this thread, or None when it is not profiled."""
+    return getattr(_local, 'profile', None)
+
+
+def finish(keep_after=0, profile=None):
+    """Stop profiling a request and keep it if it ran for at least keep_after seconds.
+
+    profile defaults to the request on this thread. Finishing a profile twice
+    does nothing.
+    """
+    if profile is None:
+        profile = current()
+    if current() is profile:
+        _local.profile = None
+    if profile is None or profile.duration is not None:
+        return None
+    profile.finish()
+    if profile.duration >= keep_after:
+        profile_store.add(profile)
+        logger.info(f"Profiled {profile.method} {profile.route} in {profile.duration:.3f}s as profile {profile.id}")
+    return profile
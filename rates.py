@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    CURRENCY_API_URL, CURRENCY_BASE, CURRENCY_REFRESH_INTERVAL,
+    CURRENCY_TIMEOUT, CURRENCY_SNAPSHOT_PATH, logger
+)
+
+
+class RatesUnavailable(Exception):
+    """Raised when no exchange rates could be fetched and none are cached."""
+
+
+class FrankfurterFetcher:
+    """Fetch the latest rate table from the Frankfurter API over a pooled session."""
+
+    def __init__(self, base_url=CURRENCY_API_URL, timeout=CURRENCY_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __call__(self, base):
+        """Return ({currency: rate per unit of base}, rate date)."""
+        response = self.session.get(f'{self.base_url}/latest', params={'from': base}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        rates = {code: float(rate) for code, rate in data['rates'].items()}
+        rates[data.get('base', base)] = 1.0
+        return rates, data.get('date')
+
+
+class RateTable:
+    """In-memory exchange rate table refreshed once per interval.
+
+    Every conversion is a local cross rate against the base currency. The
+    fetcher is any callable taking a base currency and returning
+    (rates, date), so tests can plug in a local stand-in. With a snapshot
+    path the last table is kept in SQLite so restarts start warm, and it is
+    served stale if a refresh fails.
+    """
+
+    def __init__(self, fetcher, base=CURRENCY_BASE, refresh_interval=CURRENCY_REFRESH_INTERVAL,
+                 snapshot_path=CURRENCY_SNAPSHOT_PATH):
+        self.fetcher = fetcher
+        self.base = base
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = snapshot_path
+        self.date = None
+        self._rates = None
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+        self._load_snapshot()
+
+    def rates(self):
+        """Return the current rate table, refreshing it when it is older than the interval."""
+        if self._rates is not None and time.time() - self._fetched < self.refresh_interval:
+            return self._rates
+
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self._rates is not None and time.time() - self._fetched < self.refresh_interval:
+                return self._rates
+            try:
+                rates, date = self.fetcher(self.base)
+            except Exception as e:
+                if self._rates is None:
+                    raise RatesUnavailable(f"Failed to fetch exchange rates: {str(e)}")
+                logger.warning(f"Failed to refresh exchange rates, serving rates from {self.date}: {str(e)}")
+                # Back off for a full interval before trying again
+                self._fetched = time.time()
+                return self._rates
+
+            self._rates, self.date, self._fetched = rates, date, time.time()
+            self._save_snapshot()
+            return self._rates
+
+    def convert(self, amount, from_currency, to_currency):
+        """Convert amount between two currencies, raising KeyError for unknown codes."""
+        rates = self.rates()
+        return amount * rates[to_currency.upper()] / rates[from_currency.upper()]
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with sqlite3.connect(self.snapshot_path) as conn:
+                meta = conn.execute('SELECT base, date, fetched FROM meta').fetchone()
+                if meta is None or meta[0] != self.base:
+                    return
+                self._rates = dict(conn.execute('SELECT currency, rate FROM rates').fetchall())
+                self.date, self._fetched = meta[1], meta[2]
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to load exchange rate snapshot: {str(e)}")
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            with sqlite3.connect(self.snapshot_path) as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS rates (currency TEXT PRIMARY KEY, rate REAL NOT NULL)')
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (base TEXT, date TEXT, fetched REAL)')
+                conn.execute('DELETE FROM rates')
+                conn.execute('DELETE FROM meta')
+                conn.executemany('INSERT INTO rates VALUES (?, ?)', self._rates.items())
+                conn.execute('INSERT INTO meta VALUES (?, ?, ?)', (self.base, self.date, self._fetched))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to save exchange rate snapshot: {str(e)}")
+
+
+rate_table = RateTable(FrankfurterFetcher())
@@ -1,12 +1,26 @@
-from flask import send_file, request, render_template, g
+from flask import send_file, request, render_template, g, jsonify, Response
+import random
+import time
+from functools import partial
 from extensions import limiter
-from handlers.image_handlers import handle_image_conversion
+import extensions
+import metrics
+import profiler
+from config import (
+    METRICS_ENABLED, SERVER_TIMING_ENABLED, PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_SLOW_SECONDS
+)
+from handlers.image_handlers import handle_image_conversion, handle_batch_image_conversion, handle_image_palette
 from handlers.audio_handlers import handle_audio_conversion
 from handlers.video_handlers import handle_video_conversion
+from handlers.video_preview_handlers import handle_video_frame, handle_video_contact_sheet, handle_video_trim
 from handlers.text_handlers import handle_text_conversion
+from handlers.probe_handlers import handle_probe
+from handlers.job_handlers import handle_job_status, handle_job_download
+from cache import conversion_cache
+from executors import PoolBusy, pool_stats
 from handlers.data_transfer_handlers import convert_data_transfer_rate
 from handlers.frequency_handlers import convert_frequency
-from handlers.time_handlers import convert_time
+from handlers.time_handlers import convert_time, convert_time_batch
 from handlers.weight_handlers import convert_weight
 from handlers.length_handlers import convert_length
 from handlers.volume_handlers import convert_volume
@@ -18,9 +32,10 @@ from handlers.electrical_handlers import convert_voltage, convert_current, conve
 from handlers.power_handlers import convert_power
 from handlers.area_handlers import convert_area
 from handlers.pressure_handlers import convert_pressure
-from handlers.color_handlers import convert_color
+from handlers.color_handlers import convert_color, convert_color_bulk
 from handlers.energy_handlers import convert_energy
 from handlers.angle_handlers import convert_angle
+from handlers.bulk_handlers import convert_bulk
 
 def setup_routes(app):
     """Setup all route handlers for the Flask application."""
@@ -119,21 +134,156 @@ def setup_routes(app):
         if request.path.startswith('/static/'):
             g._exempt_from_limiter = True
 
+    if METRICS_ENABLED:
+        @app.before_request
+        def start_request_timer():
+            g._request_started = time.perf_counter()
+
+        @app.after_request
+        def record_request_metrics(response):
+            started = g.get('_request_started')
+            if started is None:
+                return response
+            if SERVER_TIMING_ENABLED:
+                timings = metrics.server_timing()
+                total = f'total;dur={(time.perf_counter() - started) * 1000:.1f}'
+                response.headers['Server-Timing'] = f'{timings}, {total}' if timings else total
+            return metrics.observe_request(response, started)
+
+        def cache_gauges():
+            stats = conversion_cache.stats()
+            return [
+                (f'converter_cache_{name}', f'Conversion cache {name.replace("_", " ")}', [({}, stats[name])])
+                for name in ('entries', 'size_bytes', 'hits', 'misses', 'evictions')
+            ]
+
+        def pool_gauges():
+            stats = pool_stats()
+            return [
+                (f'converter_pool_{name}', f'Converter pool {name} tasks',
+                 [({'pool': pool}, values[name]) for pool, values in stats.items()])
+                for name in ('active', 'submitted', 'rejected')
+            ]
+
+        metrics.register_gauges(cache_gauges)
+        metrics.register_gauges(pool_gauges)
+
+        def metrics_endpoint():
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+        # Scrapers poll often; keep them out of the request rate limits
+        if extensions.limiter is not None:
+            metrics_endpoint = extensions.limiter.exempt(metrics_endpoint)
+        app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+
+    # Without PROFILE_ENABLED no hooks are installed, so requests pay nothing for profiling
+    if PROFILE_ENABLED:
+        @app.before_request
+        def start_profile():
+            if request.path.startswith(('/static/', '/profiles')):
+                return
+            requested = request.headers.get('X-Profile') == '1'
+            if requested or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+                rule = request.url_rule
+                profiler.start(rule.rule if rule is not None else request.path, request.method)
+                g._profile_requested = requested
+
+        @app.after_request
+        def finish_profile(response):
+            profile = profiler.current()
+            if profile is None:
+                return response
+            # Explicitly requested profiles are always kept; sampled ones only when slow
+            keep_after = 0 if g.get('_profile_requested') else PROFILE_SLOW_SECONDS
+            if g.get('_profile_requested'):
+                response.headers['X-Profile-Id'] = str(profile.id)
+            # Streamed bodies are generated after this hook, so sample until the body is sent
+            if metrics.call_on_close(response, partial(profiler.finish, keep_after, profile)):
+                g._profile_on_close = True
+            else:
+                profiler.finish(keep_after, profile)
+            return response
+
+        @app.teardown_request
+        def drop_profile(exc):
+            # after_request is skipped when a handler raises; never leak a sampler
+            if profiler.current() is not None and not g.get('_profile_on_close'):
+                profiler.finish(PROFILE_SLOW_SECONDS)
+
+        @app.route('/profiles', methods=['GET'])
+        def list_profiles():
+            return jsonify(profiler.profile_store.summaries())
+
+        @app.route('/profiles/<int:profile_id>', methods=['GET'])
+        def get_profile(profile_id):
+            profile = profiler.profile_store.get(profile_id)
+            if profile is None:
+                return jsonify({'success': False, 'error': 'Unknown profile'}), 404
+            return Response(profile.collapsed(), mimetype='text/plain')
+
     @app.route('/convert/text', methods=['POST'])
     def handle_text_route():
-        return handle_text_conversion(request)
+        return handle_text_conversion()
 
     @app.route('/convert/image', methods=['POST'])
     def handle_image_route():
-        return handle_image_conversion(request)
+        return handle_image_conversion()
+
+    @app.route('/convert/image/batch', methods=['POST'])
+    def handle_batch_image_route():
+        return handle_batch_image_conversion()
+
+    @app.route('/convert/image/palette', methods=['POST'])
+    def handle_image_palette_route():
+        return handle_image_palette()
 
     @app.route('/convert/audio', methods=['POST'])
     def handle_audio_route():
-        return handle_audio_conversion(request)
+        return handle_audio_conversion()
 
     @app.route('/convert/video', methods=['POST'])
     def handle_video_route():
-        return handle_video_conversion(request)
+        return handle_video_conversion()
+
+    @app.route('/convert/video/frame', methods=['POST'])
+    def handle_video_frame_route():
+        return handle_video_frame()
+
+    @app.route('/convert/video/contact-sheet', methods=['POST'])
+    def handle_video_contact_sheet_route():
+        return handle_video_contact_sheet()
+
+    @app.route('/convert/video/trim', methods=['POST'])
+    def handle_video_trim_route():
+        return handle_video_trim()
+
+    @app.route('/probe', methods=['POST'])
+    def probe_route():
+        return handle_probe()
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        return handle_job_status(job_id)
+
+    @app.route('/jobs/<job_id>/download', methods=['GET'])
+    def job_download(job_id):
+        return handle_job_download(job_id)
+
+    @app.route('/cache/stats', methods=['GET'])
+    def cache_stats():
+        return jsonify(conversion_cache.stats())
+
+    @app.route('/executors/stats', methods=['GET'])
+    def executor_stats():
+        return jsonify(pool_stats())
+
+    @app.errorhandler(PoolBusy)
+    def pool_busy(e):
+        # Back-pressure: the converter's queue is full, so ask the client to retry later
+        response = jsonify({'success': False, 'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
 
     @app.route('/convert/data_transfer', methods=['POST'])
     def handle_data_transfer_conversion():
@@ -156,6 +306,10 @@ def setup_routes(app):
         data = request.get_json()
         return convert_time(data['value'], data['from_unit'], data['to_unit'])
 
+    @app.route('/convert/time/batch', methods=['POST'])
+    def time_batch_conversion():
+        return convert_time_batch()
+
     @app.route('/convert/weight', methods=['POST'])
     def weight_conversion():
         data = request.get_json()
@@ -221,6 +375,10 @@ def setup_routes(app):
         data = request.get_json()
         return convert_pressure(data['value'], data['from_unit'], data['to_unit'])
 
+    @app.route('/convert/bulk', methods=['POST'])
+    def bulk_conversion():
+        return convert_bulk(request.get_json())
+
     @app.route('/convert/color', methods=['POST'])
     def handle_color_conversion():
         data = request.get_json()
@@ -229,6 +387,10 @@ def setup_routes(app):
         to_format = data.get('to_format')
         return convert_color(value, from_format, to_format)
 
+    @app.route('/convert/color/bulk', methods=['POST'])
+    def handle_color_bulk_conversion():
+        return convert_color_bulk(request.get_json())
+
     @app.route('/api/convert/energy', methods=['POST'])
     def energy_conversion():
         data = request.get_json()
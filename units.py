@@ -0,0 +1,180 @@
+import numpy as np
+
+# Size of each unit in its category's base unit
+UNIT_FACTORS = {
+    # Base conversion to meters
+    'length': {
+        'km': 1000,
+        'm': 1,
+        'cm': 0.01,
+        'mm': 0.001,
+        'mi': 1609.344,
+        'yd': 0.9144,
+        'ft': 0.3048,
+        'in': 0.0254
+    },
+    # Base conversion to grams
+    'weight': {
+        'kg': 1000,
+        'g': 1,
+        'mg': 0.001,
+        'lb': 453.59237,
+        'oz': 28.349523125,
+        't': 1000000  # metric ton
+    },
+    # Base conversion to liters
+    'volume': {
+        'l': 1,
+        'ml': 0.001,
+        'gal': 3.78541,
+        'qt': 0.946353,
+        'pt': 0.473176,
+        'cup': 0.236588,
+        'fl_oz': 0.0295735,
+        'm3': 1000,
+        'cm3': 0.001
+    },
+    # Base conversion to square meters
+    'area': {
+        'm2': 1,
+        'cm2': 0.0001,
+        'km2': 1000000,
+        'ha': 10000,
+        'acre': 4046.86,
+        'ft2': 0.092903,
+        'in2': 0.00064516,
+        'yd2': 0.836127
+    },
+    # Base conversion to meters per second
+    'speed': {
+        'mps': 1,
+        'kph': 0.277778,
+        'mph': 0.44704,
+        'knot': 0.514444,
+        'fps': 0.3048
+    },
+    # Base conversion to pascals
+    'pressure': {
+        'pa': 1,
+        'kpa': 1000,
+        'mpa': 1000000,
+        'bar': 100000,
+        'psi': 6894.76,
+        'atm': 101325,
+        'mmhg': 133.322,
+        'inhg': 3386.39
+    },
+    # Base conversion to watts
+    'power': {
+        'w': 1,
+        'kw': 1000,
+        'mw': 1000000,
+        'hp': 745.7,
+        'btu_h': 0.29307107,
+        'ft_lb_s': 1.355818
+    },
+    # Base unit: Joules
+    'energy': {
+        'joules': 1,
+        'kilojoules': 1000,
+        'calories': 4.184,
+        'kilocalories': 4184,
+        'watt_hours': 3600,
+        'kilowatt_hours': 3600000,
+        'electron_volts': 1.602176634e-19,
+        'british_thermal_units': 1055.06,
+        'foot_pounds': 1.355818
+    },
+    # Base conversion to Hertz (Hz)
+    'frequency': {
+        'hz': 1,
+        'khz': 1000,
+        'mhz': 1000000,
+        'ghz': 1000000000,
+        'rpm': 1/60  # 1 RPM = 1/60 Hz
+    },
+    # Base conversion to bytes
+    'filesize': {
+        'b': 1,
+        'kb': 1024,
+        'mb': 1024 * 1024,
+        'gb': 1024 * 1024 * 1024,
+        'tb': 1024 * 1024 * 1024 * 1024,
+        'pb': 1024 * 1024 * 1024 * 1024 * 1024
+    },
+    # Base conversion to bits per second (bps)
+    'data_transfer': {
+        'bps': 1,
+        'kbps': 1000,
+        'mbps': 1000000,
+        'gbps': 1000000000,
+        'B/s': 8,
+        'KB/s': 8000,
+        'MB/s': 8000000,
+        'GB/s': 8000000000
+    },
+    # Base conversion to volts
+    'voltage': {
+        'v': 1,
+        'kv': 1000,
+        'mv': 0.001
+    },
+    # Base conversion to amperes
+    'current': {
+        'a': 1,
+        'ka': 1000,
+        'ma': 0.001
+    },
+    # Base conversion to ohms
+    'resistance': {
+        'ohm': 1,
+        'kohm': 1000,
+        'mohm': 1000000
+    }
+}
+
+
+class UnitCategory:
+    """Linear units of one quantity with a precomputed from→to factor matrix."""
+
+    def __init__(self, name, factors):
+        self.name = name
+        self.units = list(factors)
+        self.factors = np.array([factors[unit] for unit in self.units], dtype=np.float64)
+        # matrix[i, j] converts a value in units[i] to units[j]
+        self.matrix = self.factors[:, np.newaxis] / self.factors[np.newaxis, :]
+
+        # Exact names win; anything else is matched case-insensitively
+        self._index = {}
+        for i, unit in enumerate(self.units):
+            self._index.setdefault(unit.lower(), i)
+        for i, unit in enumerate(self.units):
+            self._index[unit] = i
+
+    def index(self, unit):
+        """Return the matrix index of a unit, raising KeyError for unknown units."""
+        try:
+            return self._index[unit]
+        except KeyError:
+            try:
+                return self._index[unit.lower()]
+            except (KeyError, AttributeError):
+                raise KeyError(unit)
+
+    def factor(self, from_unit, to_unit):
+        """Return the multiplier that converts from_unit to to_unit."""
+        return float(self.matrix[self.index(from_unit), self.index(to_unit)])
+
+    def convert(self, values, from_unit, to_unit):
+        """Convert a scalar or array of values from one unit to another."""
+        result = np.asarray(values, dtype=np.float64) * self.matrix[self.index(from_unit), self.index(to_unit)]
+        return float(result) if result.ndim == 0 else result
+
+    def convert_many(self, values, from_units, to_units):
+        """Convert values element-wise, each with its own from and to unit."""
+        from_index = np.fromiter((self.index(unit) for unit in from_units), dtype=np.intp, count=len(from_units))
+        to_index = np.fromiter((self.index(unit) for unit in to_units), dtype=np.intp, count=len(to_units))
+        return np.asarray(values, dtype=np.float64) * self.matrix[from_index, to_index]
+
+
+UNITS = {name: UnitCategory(name, factors) for name, factors in UNIT_FACTORS.items()}
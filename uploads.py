@@ -0,0 +1,133 @@
+from flask import Request
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from config import UPLOAD_DIR, UPLOAD_SPOOL_THRESHOLD, logger
+
+
+class IngestedUpload(io.RawIOBase):
+    """Upload written straight to its on-disk location and hashed while it arrives.
+
+    Werkzeug writes the multipart body into this file and then seeks back to
+    the start, so the SHA-256 digest is complete before any handler runs.
+    Converters can use the file by path instead of copying it again. The
+    file is deleted on close unless it has been claimed.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=directory, prefix='upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self._complete = False
+        self._owned = True
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def write(self, data):
+        if self._complete:
+            # Rewritten after ingest, so the digest no longer matches
+            self._hash = None
+        elif self._hash is not None:
+            self._hash.update(data)
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # The form parser seeks back to the start once the whole part is written
+        self._complete = True
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def hexdigest(self):
+        """Return the SHA-256 of the upload, or None if it was modified after ingest."""
+        if not self._complete or self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+    def claim(self, destination):
+        """Move the upload to destination; the caller becomes responsible for deleting it."""
+        self._file.flush()
+        try:
+            os.replace(self.name, destination)
+        except OSError:
+            # Different filesystem, fall back to a copy
+            shutil.move(self.name, destination)
+        self.name = destination
+        self._owned = False
+        return destination
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self._file.close()
+        if self._owned:
+            try:
+                os.unlink(self.name)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to delete upload {self.name}: {str(e)}")
+
+
+class IngestRequest(Request):
+    """Request that streams large file uploads into IngestedUpload files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is None or total_content_length > UPLOAD_SPOOL_THRESHOLD:
+            return IngestedUpload(UPLOAD_DIR)
+        return io.BytesIO()
+
+
+def ingested(file):
+    """Return the IngestedUpload behind an uploaded file, or None for in-memory uploads."""
+    stream = getattr(file, 'stream', file)
+    return stream if isinstance(stream, IngestedUpload) else None
+
+
+def upload_digest(file):
+    """Return the digest computed during ingest, or None if there is none."""
+    upload = ingested(file)
+    return upload.hexdigest() if upload else None
+
+
+def upload_path(file):
+    """Return the on-disk path of an ingested upload, or None for in-memory uploads."""
+    upload = ingested(file)
+    return upload.name if upload else None
+
+
+def move_upload(file, destination):
+    """Put an upload at destination, moving the ingested file instead of copying it."""
+    upload = ingested(file)
+    if upload:
+        return upload.claim(destination)
+    file.save(destination)
+    return destination
+
@@ -1,8 +1,13 @@
 from flask import abort
 from werkzeug.utils import secure_filename
+import io
 import os
 import tempfile
 import logging
+import unicodedata
+from urllib.parse import quote
+from uploads import upload_path
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +25,46 @@ def validate_file(file, allowed_extensions):
     return filename
 
 def create_temp_file(file, suffix=''):
-    """Create a temporary file from uploaded file."""
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    temp_file.close()
-    file.save(temp_file.name)
+    """Create a temporary file from uploaded file.
+
+    Large uploads already live on disk, so their path is returned instead
+    of writing a second copy.
+    """
+    path = upload_path(file)
+    if path:
+        return path
+    with metrics.stage('temp_write'):
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        temp_file.close()
+        file.save(temp_file.name)
     return temp_file.name
 
+def detach_upload(file):
+    """Take ownership of an upload's stream so it outlives the request.
+
+    Flask closes uploaded files when the request is torn down, which happens
+    before a streamed response body is generated. The caller must close the
+    returned stream.
+    """
+    stream = file.stream
+    file.stream = io.BytesIO()
+    return stream
+
+def set_attachment(response, download_name):
+    """Set Content-Disposition on a hand-built response the way send_file does.
+
+    The name is quoted, and non-ASCII names are sent as an RFC 5987
+    filename* with an ASCII fallback.
+    """
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    return response
+
 def cleanup_temp_files(temp_files):
     """Clean up temporary files."""
     for temp_file in temp_files: